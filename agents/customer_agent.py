@@ -1,17 +1,87 @@
 import os
-from langchain.agents import initialize_agent, Tool, AgentType
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage
-from db.mongodb import get_user_history, save_message
-from rag.retriever import search_knowledge_base
-from utils.language import detect_language, is_arabic
+import re
+import logging
+import asyncio
+import hashlib
+import functools
+from typing import TYPE_CHECKING
+from cachetools import LRUCache
+from db.mongodb import (
+    get_user_messages, save_message_async, flush_messages_async, get_summary_state, save_conversation_summary
+)
+from utils.language import detect_language
+from utils.cache import (
+    ExactResponseCache, SemanticResponseCache, normalize_text, make_cache_key, get_faq_version
+)
 from dotenv import load_dotenv
 
+# LangChain and the FAQ retriever are imported where they are used: they take
+# hundreds of ms to load, which every process importing this module would
+# otherwise pay up front
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain.memory import ConversationSummaryBufferMemory
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Upper bound on in-flight OpenAI requests to stay inside the account's RPM/TPM limits
+# (separate conversations can't share a Chat Completions request, so concurrent
+# turns are bounded here rather than micro-batched)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+
+# Upper bound on FAQ tool calls running at once when the model issues several in one step
+TOOL_CONCURRENCY_LIMIT = 5
+
+# FAQ similarity above which the matched answer is returned without calling the LLM
+FAQ_DIRECT_ANSWER_THRESHOLD = 0.82
+
+# USE_AGENT=1 sends every message through the tool-calling agent; otherwise only
+# multi-intent messages do and the rest take the single-LLM-call fast path
+USE_AGENT = os.getenv("USE_AGENT", "0") == "1"
+
+# Connectors suggesting a message bundles more than one question
+_MULTI_INTENT_RE = re.compile(
+    r'\b(and|also)\b|[?؟].*[?؟]|وايش|وكم|وهل|وكيف|ومتى|وأيضا|وايضا|كمان',
+    re.IGNORECASE
+)
+
+# Recent user/assistant pairs kept verbatim; older turns are folded into a summary
+HISTORY_WINDOW_PAIRS = 3
+SUMMARY_MAX_TOKENS = 400
+# Messages read for the prompt: the window plus any that left it but aren't summarized yet
+HISTORY_FETCH_MESSAGES = HISTORY_WINDOW_PAIRS * 4
+# Most messages folded into the summary by one refresh
+SUMMARY_BATCH_MESSAGES = 40
+
+# System instructions per language, kept byte-identical across requests so the
+# provider's prompt-prefix caching can apply
+_SYSTEM = {
+    'ar': """أنت وكيل دعم عملاء محترف لشركة تطبيق تاكسي في المملكة العربية السعودية.
+
+مهامك الأساسية:
+- تقديم إجابات دقيقة ومفيدة لاستفسارات العملاء
+- استخدام أداة البحث في قاعدة الأسئلة الشائعة للحصول على معلومات محدثة
+- الرد باللغة العربية عندما يسأل العميل بالعربية
+- إذا لم تجد الإجابة، انصح العميل بالاتصال بالدعم على 920000000
+""",
+    'en': """You are a professional customer support agent for a taxi app company in Saudi Arabia.
+
+Your primary responsibilities:
+- Provide accurate and helpful answers to customer inquiries
+- Use the FAQ search tool to find up-to-date information
+- Respond in English when the customer asks in English
+- If you can't find the answer, advise contacting support at 920000000
+"""
+}
+
 class CustomerSupportAgent:
     def __init__(self):
+        from langchain.agents import Tool
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+        from rag.retriever import search_knowledge_base
+        
         self.llm = ChatOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
             model="gpt-4o-mini",
@@ -21,22 +91,100 @@ class CustomerSupportAgent:
             max_retries=3
         )
         
+        self._tool_semaphore = asyncio.Semaphore(TOOL_CONCURRENCY_LIMIT)
+        
         self.tools = [
             Tool(
                 name="TaxiFAQSearch",
                 func=search_knowledge_base,
+                coroutine=self._search_knowledge_base_async,
                 description="Search the taxi company's comprehensive FAQ database for answers to customer questions about bookings, payments, policies, locations, pricing, and general support. Use this tool for any customer inquiry."
             )
         ]
+        
+        # Build one agent per language up front; only the chat history changes per request
+        self._agents = {
+            language: self._create_agent(language)
+            for language in ('ar', 'en')
+        }
+        
+        self._llm_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        # Running summary refresh per user, and users whose refresh must run again once it ends
+        self._summary_tasks = {}
+        self._summary_rerun = set()
+        
+        # Response caches: exact match on the normalized message, then embedding similarity
+        self.embeddings = OpenAIEmbeddings(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model="text-embedding-3-small"
+        )
+        self._embedding_memo = LRUCache(maxsize=2048)
+        self.exact_cache = ExactResponseCache(maxsize=10_000)
+        self.sem_cache = {
+            language: SemanticResponseCache(threshold=0.93)
+            for language in ('ar', 'en')
+        }
     
-    def _create_memory_with_history(self, user_id: str) -> ConversationBufferMemory:
-        memory = ConversationBufferMemory(
+    async def embed_once(self, text: str) -> list:
+        """
+        Embed a message at most once while it stays in the memo (keyed by its sha1);
+        the vector is reused for the semantic cache lookup and insert
+        """
+        key = hashlib.sha1(text.encode('utf-8')).digest()
+        vector = self._embedding_memo.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self._embedding_memo[key] = vector
+        return vector
+    
+    async def _search_knowledge_base_async(self, query: str) -> str:
+        from rag.retriever import search_knowledge_base
+        
+        async with self._tool_semaphore:
+            return await asyncio.to_thread(search_knowledge_base, query)
+    
+    def _create_agent(self, language: str) -> "AgentExecutor":
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", self._get_system_instructions(language)),
+            MessagesPlaceholder("chat_history", optional=True),
+            ("human", "{input}"),
+            MessagesPlaceholder("agent_scratchpad")
+        ])
+        
+        # A multi-intent message yields several tool calls in one step, which
+        # AgentExecutor runs concurrently on the async path
+        agent = create_openai_tools_agent(
+            self.llm.bind(parallel_tool_calls=True),
+            self.tools,
+            prompt
+        )
+        
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=False,  # Set to True for debugging
+            handle_parsing_errors=True,
+            # One model turn: it either answers directly or calls the FAQ tool,
+            # whose output is then the answer (see _agent_output)
+            max_iterations=1,
+            early_stopping_method="force",
+            return_intermediate_steps=True
+        )
+    
+    def _new_memory(self, summary: str, history: list) -> "ConversationSummaryBufferMemory":
+        from langchain.memory import ConversationSummaryBufferMemory
+        
+        memory = ConversationSummaryBufferMemory(
+            llm=self.llm,
+            max_token_limit=SUMMARY_MAX_TOKENS,
             memory_key="chat_history",
             return_messages=True,
             output_key="output"
         )
-        
-        history = get_user_history(user_id, limit=8)
+        memory.moving_summary_buffer = summary
         
         for msg in history:
             if msg.startswith("User: "):
@@ -46,92 +194,213 @@ class CustomerSupportAgent:
         
         return memory
     
-    def _get_system_instructions(self, language: str) -> str:
-        if language == 'ar':
-            return """أنت وكيل دعم عملاء محترف لشركة تطبيق تاكسي في المملكة العربية السعودية.
-
-مهامك الأساسية:
-- تقديم إجابات دقيقة ومفيدة لاستفسارات العملاء
-- استخدام أداة البحث في قاعدة الأسئلة الشائعة للحصول على معلومات محدثة
-- الرد باللغة العربية عندما يسأل العميل بالعربية
-- إذا لم تجد الإجابة، انصح العميل بالاتصال بالدعم على 920000000
-"""
-        else:
-            return """You are a professional customer support agent for a taxi app company in Saudi Arabia.
-
-Your primary responsibilities:
-- Provide accurate and helpful answers to customer inquiries
-- Use the FAQ search tool to find up-to-date information
-- Respond in English when the customer asks in English
-- If you can't find the answer, advise contacting support at 920000000
-"""
+    async def _create_memory_with_history(self, user_id: str) -> "ConversationSummaryBufferMemory":
+        # Both reads are sync pymongo calls; run them off the event loop and overlap them
+        (summary, summarized_through), recent = await asyncio.gather(
+            asyncio.to_thread(get_summary_state, user_id),
+            asyncio.to_thread(get_user_messages, user_id, limit=HISTORY_FETCH_MESSAGES)
+        )
+        
+        # Everything after the summary's cut-off is kept verbatim, so turns whose
+        # refresh hasn't finished yet are neither lost nor repeated
+        history = [
+            text for text, timestamp in recent
+            if summarized_through is None or timestamp > summarized_through
+        ]
+        return self._new_memory(summary, history)
     
-    def run_agent(self, user_id: str, message: str) -> str:
+    async def _refresh_summary(self, user_id: str):
         """
-        Process user message and return agent response
+        Fold every message that has left the HISTORY_WINDOW_PAIRS window since the last
+        refresh into the stored summary. The summary records the timestamp it covers, so
+        each message is summarized exactly once whichever turn triggers the refresh.
         """
         try:
-            # Detect language for appropriate response
-            language = detect_language(message)
+            # The triggering turn may still be in the writer's batch
+            await flush_messages_async()
+            summary, summarized_through = await asyncio.to_thread(get_summary_state, user_id)
+            overflow = await asyncio.to_thread(
+                get_user_messages, user_id,
+                limit=SUMMARY_BATCH_MESSAGES, skip=HISTORY_WINDOW_PAIRS * 2, after=summarized_through
+            )
+            if not overflow:
+                return
             
-            # Create memory with conversation history
-            memory = self._create_memory_with_history(user_id)
+            memory = self._new_memory(summary, [text for text, _ in overflow])
+            async with self._llm_semaphore:
+                summary = await memory.apredict_new_summary(memory.chat_memory.messages, summary)
+            await asyncio.to_thread(save_conversation_summary, user_id, summary, overflow[-1][1])
+        except Exception as e:
+            logger.error("Error refreshing conversation summary: %s", e)
+    
+    def _schedule_summary_refresh(self, user_id: str):
+        # One refresh per user at a time, so two can't overwrite each other's summary;
+        # requests arriving meanwhile collapse into a single rerun
+        if user_id in self._summary_tasks:
+            self._summary_rerun.add(user_id)
+            return
+        
+        # Fire-and-forget so summarization stays off the response path
+        task = asyncio.create_task(self._refresh_summary(user_id))
+        self._summary_tasks[user_id] = task
+        task.add_done_callback(lambda _: self._summary_refresh_done(user_id))
+    
+    def _summary_refresh_done(self, user_id: str):
+        del self._summary_tasks[user_id]
+        if user_id in self._summary_rerun:
+            self._summary_rerun.discard(user_id)
+            self._schedule_summary_refresh(user_id)
+    
+    async def _save_turn(self, user_id: str, message: str, response: str, language: str):
+        await save_message_async(user_id, message, response, language)
+        # Every saved turn can push an older one out of the window
+        self._schedule_summary_refresh(user_id)
+    
+    async def _invoke(self, runnable, inputs):
+        async with self._llm_semaphore:
+            return await runnable.ainvoke(inputs)
+    
+    async def fast_path(self, message: str, language: str, chat_history: list) -> str:
+        """
+        Deterministic single-LLM-call pipeline: retrieve FAQ context, then have
+        the model write the reply from it
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+        from rag.retriever import get_faq_context
+        
+        context = await asyncio.to_thread(get_faq_context, message)
+        messages = [
+            SystemMessage(content=self._get_system_instructions(language)),
+            *chat_history,
+            HumanMessage(content=f"FAQ:\n{context}\n\nCustomer: {message}\nReply:")
+        ]
+        result = await self._invoke(self.llm, messages)
+        return result.content
+    
+    @staticmethod
+    def _agent_output(result: dict) -> str:
+        """
+        The agent's answer, or the tool observations when the iteration cap
+        stopped it after calling tools
+        """
+        steps = result.get("intermediate_steps") or []
+        if steps and result["output"].startswith("Agent stopped due to"):
+            return "\n\n".join(str(observation) for _, observation in steps)
+        return result["output"]
+    
+    @staticmethod
+    def _is_multi_intent(message: str) -> bool:
+        return bool(_MULTI_INTENT_RE.search(message))
+    
+    @staticmethod
+    def _get_system_instructions(language: str) -> str:
+        return _SYSTEM.get(language, _SYSTEM['en'])
+    
+    async def run_agent(self, user_id: str, message: str, save: bool = True) -> str:
+        """
+        Process user message and return agent response.
+        Pass save=False when the caller persists the conversation itself.
+        """
+        from rag.retriever import search_knowledge_base, search_knowledge_base_with_score
+        
+        # Detect language once; the fallback branches below reuse it
+        language = detect_language(message)
+        
+        try:
+            # Serve repeated questions from the response caches
+            faq_version = get_faq_version()
+            cache_key = make_cache_key(language, normalize_text(message), faq_version)
+            query_vector = None
             
-            # Initialize the agent with the latest settings
-            agent = initialize_agent(
-                tools=self.tools,
-                llm=self.llm,
-                agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-                memory=memory,
-                verbose=False,  # Set to True for debugging
-                handle_parsing_errors=True,
-                max_iterations=3,
-                early_stopping_method="generate"
-            )
+            cached_response = self.exact_cache.get(cache_key)
             
-            # Create contextualized prompt with system instructions
-            system_instructions = self._get_system_instructions(language)
-            contextualized_message = f"{system_instructions}\n\nCustomer: {message}"
+            # A confident FAQ match is returned verbatim without going through the agent
+            if cached_response is None:
+                # CPU-bound scoring (and the retriever build on first use); keep it off the event loop
+                faq_answer, faq_score = await asyncio.to_thread(search_knowledge_base_with_score, message)
+                if faq_score >= FAQ_DIRECT_ANSWER_THRESHOLD:
+                    cached_response = faq_answer
+            
+            if cached_response is None:
+                try:
+                    query_vector = await self.embed_once(message)
+                    cached_response = self.sem_cache[language].lookup(query_vector, faq_version)
+                except Exception as cache_error:
+                    logger.warning("Semantic cache lookup failed: %s", cache_error)
+            
+            if cached_response is not None:
+                if save:
+                    await self._save_turn(user_id, message, cached_response, language)
+                return cached_response
+            
+            # Create memory with conversation history
+            memory = await self._create_memory_with_history(user_id)
+            
+            chat_history = memory.load_memory_variables({})["chat_history"]
             
             # Get agent response with improved error handling
             try:
-                response = agent.run(contextualized_message)
+                if USE_AGENT or self._is_multi_intent(message):
+                    # Reuse the prebuilt agent; system instructions live in its prompt prefix.
+                    # History is passed as input rather than set on the shared executor so
+                    # concurrent requests can't see each other's memory.
+                    agent = self._agents.get(language, self._agents['en'])
+                    result = await self._invoke(agent, {"input": message, "chat_history": chat_history})
+                    response = self._agent_output(result)
+                else:
+                    response = await self.fast_path(message, language, chat_history)
+                
+                # The caches are keyed by the message alone, so only a reply written without
+                # this user's history or summary can be served to someone else
+                if not chat_history and response and len(response.strip()) >= 5:
+                    self.exact_cache.set(cache_key, response.strip())
+                    if query_vector is not None:
+                        self.sem_cache[language].add(query_vector, response.strip(), faq_version)
             except Exception as agent_error:
-                print(f"Agent execution error: {agent_error}")
+                logger.error("Agent execution error: %s", agent_error)
                 # Fallback to direct FAQ search
-                response = search_knowledge_base(message)
+                response = await asyncio.to_thread(search_knowledge_base, message)
                 
                 # If FAQ search also fails, provide fallback response
                 if "technical difficulties" in response.lower():
-                    if is_arabic(message):
+                    if language == 'ar':
                         response = "أعتذر، أواجه مشكلة تقنية. يرجى الاتصال بخدمة العملاء على 920000000."
                     else:
                         response = "I apologize for the technical issue. Please contact customer support at 920000000."
             
             # Ensure response is not empty
             if not response or len(response.strip()) < 5:
-                if is_arabic(message):
+                if language == 'ar':
                     response = "شكرًا لتواصلك معنا. كيف يمكنني مساعدتك اليوم؟"
                 else:
                     response = "Thank you for contacting us. How can I help you today?"
             
             # Save the conversation
-            save_message(user_id, message, response, language)
+            if save:
+                await self._save_turn(user_id, message, response, language)
             
             return response.strip()
             
         except Exception as e:
-            print(f"Critical error in agent execution: {e}")
+            logger.exception("Critical error in agent execution: %s", e)
             
             # Final fallback response based on language
-            if is_arabic(message):
+            if language == 'ar':
                 return "أعتذر، أواجه مشكلة تقنية حاليًا. يرجى الاتصال بخدمة العملاء على 920000000 للمساعدة الفورية."
             else:
                 return "I'm sorry, I'm experiencing technical difficulties. Please contact our customer support at 920000000 for immediate assistance."
 
-# Create global instance
-customer_agent = CustomerSupportAgent()
+# Global instance, built on first use
+@functools.cache
+def get_customer_agent() -> CustomerSupportAgent:
+    return CustomerSupportAgent()
+
+def __getattr__(name: str):
+    # Keeps `from agents.customer_agent import customer_agent` working
+    if name == "customer_agent":
+        return get_customer_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Convenience function for backward compatibility
+# Convenience function for backward compatibility (sync callers such as setup.py)
 def run_agent(user_id: str, message: str) -> str:
-    return customer_agent.run_agent(user_id, message) 
\ No newline at end of file
+    return asyncio.run(get_customer_agent().run_agent(user_id, message)) 
\ No newline at end of file
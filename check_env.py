@@ -31,11 +31,23 @@ else:
 print("\n" + "=" * 50)
 print("📁 Current working directory:", os.getcwd())
 print("📄 Files in current directory:")
-for file in os.listdir("."):
-    if file.startswith(".env"):
-        print(f"  ✅ {file}")
-    elif file.endswith((".py", ".csv", ".md")):
-        print(f"  📄 {file}")
+MAX_LISTED = 50
+env_files = []
+project_files = []
+with os.scandir(".") as entries:
+    for entry in entries:
+        if entry.name.startswith(".env"):
+            if len(env_files) < MAX_LISTED:
+                env_files.append(entry.name)
+        elif entry.name.endswith((".py", ".csv", ".md")):
+            if len(project_files) < MAX_LISTED:
+                project_files.append(entry.name)
+        if len(env_files) >= MAX_LISTED and len(project_files) >= MAX_LISTED:
+            break
+for file in env_files:
+    print(f"  ✅ {file}")
+for file in project_files:
+    print(f"  📄 {file}")
 
 print("\n" + "=" * 50)
 print("🔧 To fix issues:")
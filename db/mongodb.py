@@ -1,10 +1,21 @@
 import os
-from pymongo import MongoClient
-from typing import List, Dict, Any
-from datetime import datetime
+import asyncio
+import logging
+import threading
+from pymongo import MongoClient, UpdateOne
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# BSON dates keep milliseconds, so that is the step between consecutive message timestamps
+_TIMESTAMP_STEP = timedelta(milliseconds=1)
 
 class MongoDB:
     def __init__(self):
+        self._timestamp_lock = threading.Lock()
+        self._last_timestamp = datetime.min
+        
         mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         try:
             self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
@@ -24,80 +35,281 @@ class MongoDB:
                 
             self.conversations = self.db.conversations
             self.messages = self.db.messages
-            print(f"✅ Connected to MongoDB: {self.db.name}")
+            
+            # Serves get_user_history's per-user, newest-first lookup without an in-memory sort
+            self.messages.create_index([("user_id", 1), ("timestamp", -1)])
+            logger.info("Connected to MongoDB: %s", self.db.name)
             
         except Exception as e:
-            print(f"❌ MongoDB connection failed: {e}")
-            print("Please check your MONGO_URI in the .env file")
+            logger.error("MongoDB connection failed: %s. Please check your MONGO_URI in the .env file", e)
             self.client = None
             self.db = None
             self.conversations = None
             self.messages = None
 
     def get_user_history(self, user_id: str, limit: int = 10) -> List[str]:
+        return [text for text, _ in self.get_user_messages(user_id, limit)]
+
+    def get_user_messages(self, user_id: str, limit: int = 10, skip: int = 0,
+                          after: Optional[datetime] = None) -> List[Tuple[str, datetime]]:
+        """
+        ("User: ..." / "Assistant: ..." text, timestamp) pairs, oldest first: the newest
+        `limit` messages once the newest `skip` are passed over, only those after `after`
+        """
         try:
-            if not self.messages:
+            if self.messages is None:
                 return []
-                
-            messages = self.messages.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(limit * 2)
             
-            history = []
-            for msg in reversed(list(messages)):
-                if msg.get("message_type") == "user":
-                    history.append(f"User: {msg['content']}")
-                else:
-                    history.append(f"Assistant: {msg['content']}")
+            query = {"user_id": user_id}
+            if after is not None:
+                query["timestamp"] = {"$gt": after}
             
-            return history[-limit:] if len(history) > limit else history
+            # Only the fields the prompt needs; the (user_id, timestamp) index serves the sort
+            cursor = self.messages.find(
+                query,
+                projection={"content": 1, "message_type": 1, "timestamp": 1, "_id": 0}
+            ).sort("timestamp", -1).skip(skip).limit(limit)
+            
+            prefix = {"user": "User: ", "bot": "Assistant: "}
+            return [
+                (prefix.get(msg.get("message_type"), "Assistant: ") + msg["content"], msg["timestamp"])
+                for msg in reversed(list(cursor))
+            ]
         except Exception as e:
-            print(f"Error fetching user history: {e}")
+            logger.error("Error fetching user history: %s", e)
             return []
 
+    def _allocate_timestamps(self, count: int) -> List[datetime]:
+        """
+        `count` distinct, increasing timestamps from now on, one per message document, so
+        messages written in one batch still sort in the order they were sent
+        """
+        with self._timestamp_lock:
+            now = datetime.utcnow()
+            now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+            start = max(now, self._last_timestamp + _TIMESTAMP_STEP)
+            self._last_timestamp = start + _TIMESTAMP_STEP * (count - 1)
+        return [start + _TIMESTAMP_STEP * i for i in range(count)]
+
     def save_message(self, user_id: str, user_message: str, bot_response: str, language: str = "en"):
+        self.save_messages([(user_id, user_message, bot_response, language)])
+
+    def save_messages(self, turns: List[Tuple[str, str, str, str]]):
+        """
+        Persist a batch of (user_id, user_message, bot_response, language) turns
+        with one insert_many and one bulk_write
+        """
         try:
-            if not self.messages or not self.conversations:
-                print("MongoDB not connected - messages not saved")
+            if self.messages is None or self.conversations is None:
+                logger.warning("MongoDB not connected - messages not saved")
                 return
                 
-            timestamp = datetime.utcnow()
+            timestamps = iter(self._allocate_timestamps(len(turns) * 2))
             
-            self.messages.insert_one({
-                "user_id": user_id,
-                "content": user_message,
-                "message_type": "user",
-                "language": language,
-                "timestamp": timestamp
-            })
+            documents = []
+            conversation_updates = []
+            for user_id, user_message, bot_response, language in turns:
+                documents.append({
+                    "user_id": user_id,
+                    "content": user_message,
+                    "message_type": "user",
+                    "language": language,
+                    "timestamp": next(timestamps)
+                })
+                timestamp = next(timestamps)
+                documents.append({
+                    "user_id": user_id,
+                    "content": bot_response,
+                    "message_type": "bot",
+                    "language": language,
+                    "timestamp": timestamp
+                })
+                conversation_updates.append(UpdateOne(
+                    {"user_id": user_id},
+                    {
+                        "$set": {
+                            "last_interaction": timestamp,
+                            "language": language
+                        },
+                        "$inc": {"message_count": 2}
+                    },
+                    upsert=True
+                ))
             
-            self.messages.insert_one({
-                "user_id": user_id,
-                "content": bot_response,
-                "message_type": "bot",
-                "language": language,
-                "timestamp": timestamp
-            })
+            self.messages.insert_many(documents)
+            self.conversations.bulk_write(conversation_updates)
             
-            self.conversations.update_one(
+        except Exception as e:
+            logger.error("Error saving message: %s", e)
+
+    def get_conversation_summary(self, user_id: str) -> str:
+        return self.get_summary_state(user_id)[0]
+
+    def get_summary_state(self, user_id: str) -> Tuple[str, Optional[datetime]]:
+        """
+        The stored summary and the timestamp of the last message folded into it
+        """
+        try:
+            if self.conversations is None:
+                return "", None
+                
+            conversation = self.conversations.find_one(
                 {"user_id": user_id},
+                {"summary": 1, "summarized_through": 1}
+            ) or {}
+            return conversation.get("summary", ""), conversation.get("summarized_through")
+        except Exception as e:
+            logger.error("Error fetching conversation summary: %s", e)
+            return "", None
+
+    def save_conversation_summary(self, user_id: str, summary: str, summarized_through: Optional[datetime] = None):
+        try:
+            if self.conversations is None:
+                return
+            
+            if summarized_through is None:
+                self.conversations.update_one(
+                    {"user_id": user_id},
+                    {"$set": {"summary": summary}},
+                    upsert=True
+                )
+                return
+            
+            # Only move forward, so a slower refresh from another worker can't overwrite a newer summary;
+            # the conversation document already exists because its messages were saved
+            self.conversations.update_one(
                 {
-                    "$set": {
-                        "last_interaction": timestamp,
-                        "language": language
-                    },
-                    "$inc": {"message_count": 2}
+                    "user_id": user_id,
+                    "$or": [
+                        {"summarized_through": {"$exists": False}},
+                        {"summarized_through": {"$lt": summarized_through}}
+                    ]
                 },
-                upsert=True
+                {"$set": {"summary": summary, "summarized_through": summarized_through}}
             )
-            
         except Exception as e:
-            print(f"Error saving message: {e}")
+            logger.error("Error saving conversation summary: %s", e)
+
+# Queued by MessageWriter.stop: the worker writes what it has collected and exits
+_STOP = object()
+
+class MessageWriter:
+    """
+    Buffers conversation turns in an asyncio.Queue and writes them to MongoDB
+    in batches from a background task, so replies never wait on the database.
+    """
+    def __init__(self, db: MongoDB, max_batch: int = 50, flush_interval: float = 0.1):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        # A sentinel rather than cancel(), so turns the worker already took off the
+        # queue into its current batch are still written
+        self._queue.put_nowait(_STOP)
+        await self._worker
+        self._worker = None
+        
+        # Flush whatever was queued behind the sentinel
+        pending, waiters = [], []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            (waiters if isinstance(item, asyncio.Future) else pending).append(item)
+        if pending:
+            await asyncio.to_thread(self.db.save_messages, pending)
+        self._resolve(waiters)
+
+    async def flush(self):
+        """
+        Wait until every turn enqueued so far has been written
+        """
+        if not self.running:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(done)
+        await done
+
+    async def enqueue(self, user_id: str, user_message: str, bot_response: str, language: str = "en"):
+        if self.running:
+            self._queue.put_nowait((user_id, user_message, bot_response, language))
+        else:
+            # No event-loop worker (e.g. sync scripts); write directly
+            await asyncio.to_thread(self.db.save_message, user_id, user_message, bot_response, language)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch, waiters = [], []
+            item = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+            
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, asyncio.Future):
+                    # flush(): write what has been collected now instead of at the deadline
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                
+                timeout = deadline - loop.time()
+                if len(batch) >= self.max_batch or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            
+            if batch:
+                await asyncio.to_thread(self.db.save_messages, batch)
+            self._resolve(waiters)
+
+    @staticmethod
+    def _resolve(waiters):
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
 
 mongodb = MongoDB()
+message_writer = MessageWriter(mongodb)
 
 def get_user_history(user_id: str, limit: int = 10) -> List[str]:
     return mongodb.get_user_history(user_id, limit)
 
+def get_user_messages(user_id: str, limit: int = 10, skip: int = 0,
+                      after: Optional[datetime] = None) -> List[Tuple[str, datetime]]:
+    return mongodb.get_user_messages(user_id, limit, skip, after)
+
 def save_message(user_id: str, user_message: str, bot_response: str, language: str = "en"):
-    mongodb.save_message(user_id, user_message, bot_response, language) 
\ No newline at end of file
+    mongodb.save_message(user_id, user_message, bot_response, language) 
+
+def get_conversation_summary(user_id: str) -> str:
+    return mongodb.get_conversation_summary(user_id)
+
+def get_summary_state(user_id: str) -> Tuple[str, Optional[datetime]]:
+    return mongodb.get_summary_state(user_id)
+
+def save_conversation_summary(user_id: str, summary: str, summarized_through: Optional[datetime] = None):
+    mongodb.save_conversation_summary(user_id, summary, summarized_through)
+
+async def save_message_async(user_id: str, user_message: str, bot_response: str, language: str = "en"):
+    await message_writer.enqueue(user_id, user_message, bot_response, language)
+
+async def flush_messages_async():
+    await message_writer.flush()
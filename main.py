@@ -1,15 +1,57 @@
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 import os
+import orjson
+import asyncio
+import logging
 from dotenv import load_dotenv
 from models.schemas import ChatRequest, ChatResponse, WebhookMessage
-from agents.customer_agent import run_agent
-from utils.whatsapp import send_whatsapp_reply_meta, verify_webhook, parse_whatsapp_message
+from agents.customer_agent import get_customer_agent
+from db.mongodb import message_writer
+from utils.whatsapp import (
+    send_whatsapp_reply_meta_async, verify_webhook, parse_whatsapp_message, close_whatsapp_client
+)
 from utils.language import detect_language
+from utils.logging_setup import configure_logging
 
 load_dotenv()
+configure_logging()
 
-app = FastAPI(title="Taxi Customer Support Chatbot", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="Taxi Customer Support Chatbot",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+@app.on_event("startup")
+async def start_message_writer():
+    message_writer.start()
+
+@app.on_event("startup")
+async def warm_up_agent():
+    from rag.retriever import get_retriever
+    
+    # Build the agent and load the FAQ retriever off the event loop, then open the chat and
+    # embedding connections once, so the first real customer doesn't pay for any of it
+    try:
+        customer_agent = await asyncio.to_thread(get_customer_agent)
+        await asyncio.to_thread(get_retriever)
+        await asyncio.wait_for(
+            asyncio.gather(customer_agent.llm.ainvoke("ping"), customer_agent.embed_once("ping")),
+            timeout=30
+        )
+    except Exception as e:
+        logger.warning("Warm-up failed: %s", e)
+
+@app.on_event("shutdown")
+async def stop_message_writer():
+    await message_writer.stop()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await close_whatsapp_client()
 
 @app.get("/")
 async def root():
@@ -27,40 +69,61 @@ async def verify_webhook_endpoint(
     else:
         raise HTTPException(status_code=403, detail="Webhook verification failed")
 
+async def answer_user_messages(messages):
+    """
+    Answer one user's messages in the order received, sending each reply before the next turn
+    """
+    results = []
+    for position, message_data in enumerate(messages, 1):
+        user_id = message_data["user_id"]
+        logger.debug("Processing message from %s (%s): %s", message_data["user_name"], user_id, message_data["message"])
+        
+        # The turn is queued for a background batch write, so this only waits on the LLM
+        response = await get_customer_agent().run_agent(user_id, message_data["message"])
+        
+        success = await send_whatsapp_reply_meta_async(user_id, response)
+        results.append({"status": "message_sent" if success else "message_failed", "response": response})
+        
+        # Turns are persisted by the batched writer; make sure this one is in Mongo
+        # before the next turn reads the user's history
+        if position < len(messages):
+            await message_writer.flush()
+    return results
+
 @app.post("/webhook")
 async def whatsapp_webhook(request: Request):
     try:
-        data = await request.json()
-        print(f"Received webhook data: {data}")
+        data = orjson.loads(await request.body())
+        logger.debug("webhook", extra={"data": data})
         
-        message_data = parse_whatsapp_message(data)
+        messages = parse_whatsapp_message(data)
         
-        if not message_data:
+        if not messages:
             return {"status": "no_message"}
         
-        user_id = message_data["user_id"]
-        user_message = message_data["message"]
-        user_name = message_data["user_name"]
-        
-        print(f"Processing message from {user_name} ({user_id}): {user_message}")
-        
-        response = run_agent(user_id, user_message)
-        
-        success = send_whatsapp_reply_meta(user_id, response)
+        # Different users are answered concurrently (their sends share the pooled HTTP/2 client);
+        # one user's messages are answered in order, each seeing the previous turn in its history
+        by_user = {}
+        for message_data in messages:
+            by_user.setdefault(message_data["user_id"], []).append(message_data)
+        per_user = await asyncio.gather(*(answer_user_messages(user_messages) for user_messages in by_user.values()))
+        results = [result for user_results in per_user for result in user_results]
         
-        if success:
-            return {"status": "message_sent", "response": response}
-        else:
-            return {"status": "message_failed", "response": response}
+        if len(results) == 1:
+            return results[0]
+        return {
+            "status": "message_sent" if all(result["status"] == "message_sent" for result in results) else "message_failed",
+            "results": results
+        }
             
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.exception("Error processing webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(chat_request: ChatRequest):
     try:
-        response = run_agent(chat_request.user_id, chat_request.message)
+        response = await get_customer_agent().run_agent(chat_request.user_id, chat_request.message)
         language = detect_language(chat_request.message)
         
         return ChatResponse(
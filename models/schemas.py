@@ -1,18 +1,27 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
+# Shared by all request/response schemas: unknown fields are dropped and instances are immutable
+_SCHEMA_CONFIG = ConfigDict(extra='ignore', str_strip_whitespace=True, frozen=True)
+
 class ChatRequest(BaseModel):
+    model_config = _SCHEMA_CONFIG
+    
     user_id: str
     message: str
     language: Optional[str] = "en"
 
 class ChatResponse(BaseModel):
+    model_config = _SCHEMA_CONFIG
+    
     reply: str
     language: str
     confidence: Optional[float] = None
 
 class WebhookMessage(BaseModel):
+    model_config = _SCHEMA_CONFIG
+    
     user_id: str
     user_name: str
     message: str
@@ -20,6 +29,8 @@ class WebhookMessage(BaseModel):
     timestamp: str
 
 class UserHistory(BaseModel):
+    model_config = _SCHEMA_CONFIG
+    
     user_id: str
     messages: list[str]
     last_interaction: Optional[datetime] = None
@@ -0,0 +1,336 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+from rapidfuzz import fuzz, process
+from sklearn.feature_extraction.text import TfidfVectorizer
+from utils.cache import FAQ_CSV_PATH
+
+# TF-IDF shortlists this many FAQs per query; only they get the exact (slower) similarity score
+RERANK_CANDIDATES = 10
+# Below this many FAQs a linear scan is as fast as an HNSW graph search, and exact
+HNSW_MIN_ENTRIES = 2000
+
+_WORD_RE = re.compile(r'\b\w+\b')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+STOP_WORDS = frozenset({
+    'how', 'what', 'where', 'when', 'why', 'do', 'does', 'can', 'could', 'would', 'should',
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'كيف', 'ماذا', 'أين', 'متى', 'لماذا', 'هل', 'يمكن', 'في', 'على', 'إلى', 'من', 'مع'
+})
+
+# Preprocessed FAQ index persisted across restarts; bump the version when its structure changes
+FAQ_INDEX_CACHE_VERSION = 1
+FAQ_INDEX_CACHE_PATTERN = '.faq_cache_v{version}_{digest}.pkl'
+
+# Parsed FAQ data shared by every retriever in the process, keyed by (csv path, mtime_ns)
+_FAQ_CACHE = {}
+_FAQ_CACHE_LOCK = threading.Lock()
+
+def extract_keywords(text):
+    words = _WORD_RE.findall(text.lower())
+    return [word for word in words if word not in STOP_WORDS and len(word) > 2]
+
+def clean_question(text):
+    """
+    Lowercase and strip punctuation (Arabic punctuation included)
+    """
+    return _PUNCT_RE.sub('', text.lower())
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first, via argpartition instead of a full sort
+    """
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+def _read_faq_pairs(csv_path):
+    df = pd.read_csv(csv_path, engine='pyarrow', dtype_backend='pyarrow')
+
+    columns = [(col, col.lower().strip()) for col in df.columns]
+    question_col = next(col for col, name in columns if 'question' in name or name == 'q')
+    answer_col = next(
+        col for col, name in columns
+        if col != question_col and ('answer' in name or name == 'a' or 'response' in name)
+    )
+
+    df = df[[question_col, answer_col]].dropna().rename(
+        columns={question_col: 'question', answer_col: 'answer'}
+    )
+    df = df.astype(str).apply(lambda column: column.str.strip())
+    df = df[(df['question'] != '') & (df['answer'] != '')]
+    return zip(df['question'].tolist(), df['answer'].tolist())
+
+def build_vocab(token_sets):
+    """
+    Token -> bit position for every token in `token_sets`, in first-seen order
+    """
+    vocab = {}
+    for tokens in token_sets:
+        for token in tokens:
+            vocab.setdefault(token, len(vocab))
+    return vocab
+
+def pack_token_sets(token_sets, vocab):
+    """
+    (N, ceil(V/64)) uint64 bitsets of token sets over `vocab`, so overlaps are np.bitwise_count over AND/OR
+    """
+    packed = np.zeros((len(token_sets), max(1, -(-len(vocab) // 64))), dtype=np.uint64)
+    for row, tokens in enumerate(token_sets):
+        for token in tokens:
+            index = vocab[token]
+            packed[row, index >> 6] |= np.uint64(1 << (index & 63))
+    return packed
+
+def _build_faq_index(csv_path):
+    pairs = list(_read_faq_pairs(csv_path))
+    questions = np.array([question for question, _ in pairs], dtype=object)
+    answers = np.array([answer for _, answer in pairs], dtype=object)
+    questions_lower = np.array([question.lower() for question in questions], dtype=object)
+    keyword_sets = [frozenset(extract_keywords(question)) for question in questions]
+
+    documents = [question + ' ' + answer for question, answer in pairs]
+    word_sets = [frozenset(document.lower().split()) for document in documents]
+
+    # Keyword and word sets become fixed-width bitsets over their own vocabularies
+    vocab = build_vocab(keyword_sets)
+    word_vocab = build_vocab(word_sets)
+
+    vectorizer = None
+    matrix = None
+    if pairs:
+        vectorizer = TfidfVectorizer(lowercase=True, token_pattern=r"\b\w+\b", ngram_range=(1, 2))
+        matrix = vectorizer.fit_transform(documents)
+
+    return SimpleNamespace(
+        questions=questions,
+        answers=answers,
+        questions_lower=questions_lower,
+        keyword_masks=pack_token_sets(keyword_sets, vocab),
+        keyword_counts=np.array([len(keywords) for keywords in keyword_sets], dtype=np.int64),
+        word_masks=pack_token_sets(word_sets, word_vocab),
+        vocab=vocab,
+        word_vocab=word_vocab,
+        vectorizer=vectorizer,
+        matrix=matrix,
+        # Punctuation-free question text -> first FAQ index with that question
+        question_lookup={
+            ' '.join(clean_question(question).split()): index
+            for index, question in reversed(list(enumerate(questions_lower)))
+        }
+    )
+
+def _empty_faq_index():
+    return SimpleNamespace(
+        questions=np.array([], dtype=object), answers=np.array([], dtype=object),
+        questions_lower=np.array([], dtype=object),
+        keyword_masks=pack_token_sets([], {}), keyword_counts=np.array([], dtype=np.int64),
+        word_masks=pack_token_sets([], {}), vocab={}, word_vocab={}, vectorizer=None, matrix=None, question_lookup={}
+    )
+
+def faq_csv_sha256(csv_path=FAQ_CSV_PATH):
+    """
+    Content hash of the FAQ CSV, for on-disk artifacts that must match the parsed data
+    """
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_or_build_pickled(csv_path, cache_pattern, version, build):
+    """
+    Read `build(csv_path)`'s result from disk when one was pickled for this exact CSV
+    content, otherwise build it and write it for the next process start.
+    `cache_pattern` is formatted with `version` and the CSV's sha256 `digest`.
+    """
+    cache_path = os.path.join(
+        os.path.dirname(csv_path),
+        cache_pattern.format(version=version, digest=faq_csv_sha256(csv_path))
+    )
+
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable FAQ cache {cache_path}: {e}")
+
+    result = build(csv_path)
+
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not write FAQ cache {cache_path}: {e}")
+
+    return result
+
+def _load_or_build_faq_index(csv_path):
+    return load_or_build_pickled(csv_path, FAQ_INDEX_CACHE_PATTERN, FAQ_INDEX_CACHE_VERSION, _build_faq_index)
+
+def load_faq_index(csv_path=FAQ_CSV_PATH):
+    """
+    Parsed FAQ items plus their search structures; rebuilt only when the CSV changes
+    """
+    key = (csv_path, os.stat(csv_path).st_mtime_ns)
+    with _FAQ_CACHE_LOCK:
+        faq_index = _FAQ_CACHE.get(key)
+        if faq_index is None:
+            faq_index = _load_or_build_faq_index(csv_path)
+            for stale_key in [k for k in _FAQ_CACHE if k[0] == csv_path]:
+                del _FAQ_CACHE[stale_key]
+            _FAQ_CACHE[key] = faq_index
+    return faq_index
+
+class BaseFAQRetriever:
+    """
+    FAQ loading and scoring shared by the OpenAI and Gemini retrievers.
+    Subclasses set `self.llm` before calling super().__init__().
+
+    FAQ entries are stored as parallel arrays (questions, answers,
+    questions_lower, keyword/word bitsets) indexed by FAQ position.
+    """
+    def __init__(self, csv_path=FAQ_CSV_PATH):
+        self.csv_path = csv_path
+        # query -> ranked matches; the agent scores a message and then builds context for the same text
+        self._ranking_memo = LRUCache(maxsize=1024)
+        self._ranking_lock = threading.Lock()
+        self.load_faq_data()
+
+    def load_faq_data(self):
+        try:
+            faq_index = load_faq_index(self.csv_path)
+        except Exception as e:
+            print(f"❌ Error loading FAQ data: {e}")
+            faq_index = _empty_faq_index()
+
+        self.questions = faq_index.questions
+        self.answers = faq_index.answers
+        self.questions_lower = faq_index.questions_lower
+        self.keyword_masks = faq_index.keyword_masks
+        self.keyword_counts = faq_index.keyword_counts
+        self.word_masks = faq_index.word_masks
+        self.vocab = faq_index.vocab
+        self.word_vocab = faq_index.word_vocab
+        self.vectorizer = faq_index.vectorizer
+        self.faq_matrix = faq_index.matrix
+        self.question_lookup = faq_index.question_lookup
+        with self._ranking_lock:
+            self._ranking_memo.clear()
+        return self.faq_count
+
+    @property
+    def faq_count(self):
+        return len(self.answers)
+
+    def _llm_invoke(self, prompt) -> str:
+        response = self.llm.invoke(prompt)
+        if hasattr(response, 'content'):
+            return response.content.strip()
+        return str(response).strip()
+
+    def _extract_keywords(self, text):
+        return extract_keywords(text)
+
+    def _tfidf_candidates(self, query, count=RERANK_CANDIDATES):
+        """
+        Indices of the FAQs with the highest TF-IDF cosine similarity to the query
+        """
+        query_vector = self.vectorizer.transform([query])
+        scores = (self.faq_matrix @ query_vector.T).toarray().ravel()
+
+        # No vocabulary overlap gives TF-IDF nothing to rank by; score every FAQ instead
+        if query_vector.nnz == 0 or count >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, count)[:count]
+        return top[np.argsort(-scores[top])]
+
+    @staticmethod
+    def _pack_query(tokens, vocab, width):
+        """
+        Bitset of the query tokens found in `vocab`, plus the number of tokens outside it
+        """
+        packed = np.zeros(width, dtype=np.uint64)
+        unknown = 0
+        for token in tokens:
+            index = vocab.get(token)
+            if index is None:
+                unknown += 1
+            else:
+                packed[index >> 6] |= np.uint64(1 << (index & 63))
+        return packed, unknown
+
+    def _question_similarities(self, query_text, indices=None):
+        """
+        Fuzzy ratio (0-1) of the query against every FAQ question, or only those at `indices`
+        """
+        questions = self.questions_lower if indices is None else self.questions_lower[indices]
+        # fuzz.ratio is the normalized Indel similarity (0-100), the same measure SequenceMatcher.ratio approximates
+        return process.cdist([query_text], questions, scorer=fuzz.ratio, workers=-1)[0] / 100.0
+
+    def _word_overlaps(self, user_words, indices):
+        """
+        Fraction of the user's words that appear in each FAQ's question + answer
+        """
+        query_mask, _ = self._pack_query(user_words, self.word_vocab, self.word_masks.shape[1])
+        overlaps = np.bitwise_count(self.word_masks[indices] & query_mask).sum(axis=1)
+        return overlaps / max(len(user_words), 1)
+
+    def _calculate_similarities(self, query_lower, query_keywords, indices):
+        """
+        Score the FAQs at `indices` against a query preprocessed once by the caller:
+        0.6 * fuzzy text ratio + 0.4 * keyword Jaccard
+        """
+        text_similarity = self._question_similarities(query_lower, indices)
+
+        # Jaccard over keyword bitsets; keywords unknown to the FAQ only ever add to the union
+        keyword_similarity = np.zeros(len(indices))
+        if query_keywords:
+            query_mask, unknown = self._pack_query(query_keywords, self.vocab, self.keyword_masks.shape[1])
+            faq_masks = self.keyword_masks[indices]
+            intersection = np.bitwise_count(faq_masks & query_mask).sum(axis=1)
+            union = np.bitwise_count(faq_masks | query_mask).sum(axis=1) + unknown
+            has_keywords = self.keyword_counts[indices] > 0
+            np.divide(intersection, union, out=keyword_similarity, where=has_keywords)
+
+        return (text_similarity * 0.6) + (keyword_similarity * 0.4)
+
+    def _find_best_matches(self, query, top_k=3):
+        """
+        Up to top_k (score, FAQ index) pairs, best first (top_k is capped at RERANK_CANDIDATES)
+        """
+        if not self.faq_count:
+            return []
+
+        with self._ranking_lock:
+            ranked = self._ranking_memo.get(query)
+        if ranked is None:
+            ranked = self._rank_matches(query)
+            with self._ranking_lock:
+                self._ranking_memo[query] = ranked
+        return ranked[:top_k]
+
+    def _rank_matches(self, query):
+        query_lower = query.lower()
+        query_keywords = frozenset(self._extract_keywords(query))
+
+        candidates = self._tfidf_candidates(query)
+        scores = self._calculate_similarities(query_lower, query_keywords, candidates)
+
+        return [
+            (float(scores[position]), int(candidates[position]))
+            for position in top_k_indices(scores, RERANK_CANDIDATES)
+            if scores[position] > 0.1
+        ]
@@ -1,45 +1,44 @@
 #!/usr/bin/env python3
 
 import os
-import pandas as pd
+import asyncio
+import numpy as np
 import google.generativeai as genai
 from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain.prompts import PromptTemplate
+from langchain_core.outputs import Generation
 from dotenv import load_dotenv
-from difflib import SequenceMatcher
-import re
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+from rag.base import BaseFAQRetriever, clean_question, top_k_indices, faq_csv_sha256, HNSW_MIN_ENTRIES
+from utils.language import detect_language as detect_language_code, get_language_name
+from utils.cache import (
+    ExactResponseCache, SemanticResponseCache, normalize_text, make_cache_key, get_faq_version, get_llm_cache
+)
 
 load_dotenv()
 
-class GeminiFAQRetriever:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        
-        self.llm = GoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=api_key,
-            temperature=0.7,
-            max_output_tokens=500
-        )
-        
-        self.faq_data = self.load_faq_data()
-        print(f"✅ Loaded {len(self.faq_data)} FAQ entries for Gemini retriever")
-        
-        self.prompt_template = PromptTemplate(
-            input_variables=["context", "question", "user_language"],
-            template="""
+EMBEDDING_MODEL = "models/embedding-001"
+FAQ_EMBEDDINGS_PATH = 'faq_emb.npy'
+# Holds "<model>:<csv sha256>" for the matrix in FAQ_EMBEDDINGS_PATH
+FAQ_EMBEDDINGS_HASH_PATH = 'faq_emb.sha256'
+FAQ_HNSW_PATH = 'faq.hnsw'
+FAQ_HNSW_HASH_PATH = 'faq.hnsw.sha256'
+# FAQs at or below this cosine similarity to the query are left out of the context
+MIN_EMBEDDING_SCORE = 0.5
+
+# Invariant parts of the answer prompt, joined around context/question/language per request
+_PROMPT_PREFIX = """
 You are a helpful customer support assistant for a taxi/ride-hailing service. 
 Use the following FAQ context to answer the user's question accurately and helpfully.
 
 FAQ Context:
-{context}
-
-User Question: {question}
-Detected Language: {user_language}
+"""
+_PROMPT_QUESTION = "\n\nUser Question: "
+_PROMPT_LANGUAGE = "\nDetected Language: "
+_PROMPT_SUFFIX = """
 
 Instructions:
 1. Answer in the same language as the user's question
@@ -50,130 +49,298 @@ Instructions:
 
 Answer:
 """
+
+def detect_language_name(text):
+    """
+    'Arabic' or 'English' for the prompt, by the same Arabic-share rule as the cache key
+    """
+    return get_language_name(detect_language_code(text))
+
+class GeminiFAQRetriever(BaseFAQRetriever):
+    def __init__(self):
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        
+        genai.configure(api_key=api_key)
+        
+        self.llm = GoogleGenerativeAI(
+            model="gemini-1.5-flash",
+            google_api_key=api_key,
+            temperature=0.7,
+            max_output_tokens=500,
+            cache=get_llm_cache()
         )
+        
+        # Answer caches: exact match on the normalized question, then embedding similarity
+        self.embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key
+        )
+        self.answer_cache = ExactResponseCache(maxsize=2048)
+        # One semantic cache per language, so a cross-lingual paraphrase can't be answered in the other language
+        self.semantic_cache = {
+            language: SemanticResponseCache(threshold=0.92, max_entries=2048)
+            for language in ('ar', 'en')
+        }
+        
+        super().__init__()
+        # Searched through FAISS (8-bit scalar-quantized scan, or HNSW for large FAQs);
+        # the float32 matrix is only kept when FAISS is unavailable
+        self.faq_emb = None
+        self.faq_index = None
+        faq_emb = self._load_faq_embeddings()
+        if faq_emb is not None:
+            self.faq_index = self._load_faq_index(faq_emb)
+            if self.faq_index is None:
+                self.faq_emb = faq_emb
+        print(f"✅ Loaded {self.faq_count} FAQ entries for Gemini retriever")
     
-    def load_faq_data(self):
+    def _load_faq_embeddings(self):
+        """
+        L2-normalized (N, D) float32 embeddings of every FAQ question + answer, or None
+        to fall back to lexical scoring. Persisted next to the CSV and reused while the
+        CSV content and embedding model are unchanged.
+        """
+        if not self.faq_count:
+            return None
+        
         try:
-            df = pd.read_csv('bot-data.csv')
-            faq_data = []
+            fingerprint = self._embeddings_fingerprint()
             
-            for _, row in df.iterrows():
-                question = ""
-                answer = ""
-                
-                for col in df.columns:
-                    col_lower = col.lower().strip()
-                    if 'question' in col_lower or 'q' == col_lower:
-                        question = str(row[col]).strip()
-                    elif 'answer' in col_lower or 'a' == col_lower or 'response' in col_lower:
-                        answer = str(row[col]).strip()
-                
-                if question and answer and question != 'nan' and answer != 'nan':
-                    faq_data.append({
-                        'question': question,
-                        'answer': answer
-                    })
+            if self._read_fingerprint(FAQ_EMBEDDINGS_HASH_PATH) == fingerprint and os.path.exists(FAQ_EMBEDDINGS_PATH):
+                faq_emb = np.load(FAQ_EMBEDDINGS_PATH)
+                if faq_emb.shape[0] == self.faq_count:
+                    return faq_emb
+            
+            faq_emb = np.asarray(
+                self.embeddings.embed_documents([question + ' ' + answer for question, answer in zip(self.questions, self.answers)]),
+                dtype=np.float32
+            )
+            faq_emb /= np.maximum(np.linalg.norm(faq_emb, axis=1, keepdims=True), 1e-12)
             
-            return faq_data
+            np.save(FAQ_EMBEDDINGS_PATH, faq_emb)
+            with open(FAQ_EMBEDDINGS_HASH_PATH, 'w') as f:
+                f.write(fingerprint)
+            return faq_emb
         except Exception as e:
-            print(f"❌ Error loading FAQ data: {e}")
-            return []
+            print(f"⚠️ FAQ embeddings unavailable, using text matching: {e}")
+            return None
     
-    def detect_language(self, text):
-        try:
-            from langdetect import detect
-            lang = detect(text)
-            return 'Arabic' if lang == 'ar' else 'English'
-        except:
-            arabic_chars = re.findall(r'[\u0600-\u06FF]', text)
-            return 'Arabic' if arabic_chars else 'English'
+    def _embeddings_fingerprint(self):
+        return f"{EMBEDDING_MODEL}:{faq_csv_sha256(self.csv_path)}"
     
-    def similarity(self, a, b):
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    @staticmethod
+    def _read_fingerprint(path):
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
     
-    def find_relevant_context(self, user_question, max_context=5):
-        if not self.faq_data:
-            return ""
-        
-        scored_faqs = []
-        user_question_clean = re.sub(r'[^\w\s]', '', user_question.lower())
-        user_words = set(user_question_clean.split())
+    def _load_faq_index(self, faq_emb):
+        """
+        FAISS index over the normalized FAQ embeddings: an 8-bit scalar-quantized flat
+        index for small FAQs, or an HNSW graph persisted like the embeddings for large
+        ones. None means the float32 matrix is scanned instead.
+        """
+        if not FAISS_AVAILABLE:
+            return None
         
-        for item in self.faq_data:
-            question_similarity = self.similarity(user_question_clean, item['question'])
+        try:
+            faq_emb = np.ascontiguousarray(faq_emb, dtype=np.float32)
+            if len(faq_emb) < HNSW_MIN_ENTRIES:
+                index = faiss.IndexScalarQuantizer(
+                    faq_emb.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+                )
+                index.train(faq_emb)
+                index.add(faq_emb)
+                return index
             
-            faq_words = set((item['question'] + ' ' + item['answer']).lower().split())
-            word_overlap = len(user_words.intersection(faq_words)) / max(len(user_words), 1)
+            fingerprint = self._embeddings_fingerprint()
+            if self._read_fingerprint(FAQ_HNSW_HASH_PATH) == fingerprint and os.path.exists(FAQ_HNSW_PATH):
+                index = faiss.read_index(FAQ_HNSW_PATH)
+                if index.ntotal == len(faq_emb):
+                    return index
             
-            combined_score = (question_similarity * 0.6) + (word_overlap * 0.4)
+            index = faiss.IndexHNSWFlat(faq_emb.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.add(faq_emb)
             
-            scored_faqs.append({
-                'score': combined_score,
-                'question': item['question'],
-                'answer': item['answer']
-            })
+            faiss.write_index(index, FAQ_HNSW_PATH)
+            with open(FAQ_HNSW_HASH_PATH, 'w') as f:
+                f.write(fingerprint)
+            return index
+        except Exception as e:
+            print(f"⚠️ FAISS index unavailable, using linear scan: {e}")
+            return None
+    
+    def detect_language(self, text):
+        return detect_language_name(text)
+    
+    def find_relevant_context(self, user_question, max_context=5, query_vector=None):
+        if not self.faq_count:
+            return ""
         
-        scored_faqs.sort(key=lambda x: x['score'], reverse=True)
-        top_faqs = scored_faqs[:max_context]
+        if (self.faq_index is not None or self.faq_emb is not None) and query_vector is not None:
+            return self._embedding_context(query_vector, max_context)
         
+        user_question_clean = clean_question(user_question)
+        user_words = frozenset(user_question_clean.split())
+        
+        candidates = self._tfidf_candidates(user_question)
+        scores = (self._question_similarities(user_question_clean, candidates) * 0.6) + \
+            (self._word_overlaps(user_words, candidates) * 0.4)
+        
+        ranked = [(candidates[position], scores[position]) for position in top_k_indices(scores, max_context)]
+        return self._format_context(ranked, min_score=0.1)
+    
+    def _format_context(self, ranked, min_score):
+        """
+        FAQ context for the prompt from (FAQ index, score) pairs, best first; only the winners' text is read
+        """
         context_parts = []
-        for i, faq in enumerate(top_faqs, 1):
-            if faq['score'] > 0.1:
-                context_parts.append(f"FAQ {i}:\nQ: {faq['question']}\nA: {faq['answer']}")
+        for i, (index, score) in enumerate(ranked, 1):
+            if score > min_score:
+                context_parts.append(f"FAQ {i}:\nQ: {self.questions[index]}\nA: {self.answers[index]}")
         
         return "\n\n".join(context_parts)
     
-    def get_answer(self, user_question):
+    def _embedding_context(self, query_vector, max_context):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        
+        if self.faq_index is not None:
+            index_scores, index_ids = self.faq_index.search(query[None, :], max_context)
+            ranked = [(int(index), float(score)) for index, score in zip(index_ids[0], index_scores[0]) if index >= 0]
+        else:
+            scores = self.faq_emb @ query
+            ranked = [(index, scores[index]) for index in top_k_indices(scores, max_context)]
+        
+        return self._format_context(ranked, min_score=MIN_EMBEDDING_SCORE)
+    
+    def get_answer(self, user_question, fallback=True):
+        return asyncio.run(self.aget_answer(user_question, fallback))
+    
+    async def aget_answer(self, user_question, fallback=True):
+        chunks = [chunk async for chunk in self.astream_answer(user_question, fallback)]
+        return "".join(chunks).strip()
+    
+    async def _aembed_query(self, user_question):
         try:
-            user_language = self.detect_language(user_question)
-            
-            context = self.find_relevant_context(user_question)
-            
-            if not context:
-                return "I'm sorry, I couldn't find relevant information in our FAQ. Please contact our support team for assistance."
-            
-            prompt = self.prompt_template.format(
-                context=context,
-                question=user_question,
-                user_language=user_language
-            )
-            
-            response = self.llm.invoke(prompt)
+            return await self.embeddings.aembed_query(user_question)
+        except Exception as e:
+            print(f"⚠️ Query embedding failed: {e}")
+            return None
+    
+    async def astream_answer(self, user_question, fallback=True):
+        """
+        Yield the answer as Gemini generates it. The query embedding and language
+        detection run concurrently; the embedding then serves both the semantic
+        cache and FAQ retrieval. Cached answers and fallbacks are yielded as a
+        single chunk. With fallback=False a Gemini error is raised instead of
+        being answered by keyword matching, so callers can tell the two apart.
+        """
+        started = False
+        try:
+            async for chunk in self._astream_generated(user_question):
+                started = True
+                yield chunk
+        except Exception as e:
+            print(f"❌ Gemini answer failed: {e}")
+            if not fallback:
+                raise
+            # Once part of the answer reached the caller, the keyword fallback can't stand in for it
+            if not started:
+                yield self.fallback_simple_answer(user_question)
+    
+    def _llm_string(self):
+        """
+        Key LangChain's LLM cache files self.llm's generations under, as in BaseLLM.agenerate
+        """
+        params = self.llm.dict()
+        params["stop"] = None
+        return str(sorted(params.items()))
+    
+    async def _astream_generated(self, user_question):
+        faq_version = get_faq_version()
+        language = detect_language_code(user_question)
+        cache_key = make_cache_key(language, normalize_text(user_question), faq_version)
+        
+        cached_answer = self.answer_cache.get(cache_key)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+        
+        query_vector, user_language = await asyncio.gather(
+            self._aembed_query(user_question),
+            asyncio.to_thread(self.detect_language, user_question)
+        )
+        
+        if query_vector is not None:
+            cached_answer = self.semantic_cache[language].lookup(query_vector, faq_version)
+            if cached_answer is not None:
+                self.answer_cache.set(cache_key, cached_answer)
+                yield cached_answer
+                return
+        
+        # The same query embedding drives retrieval; without it, lexical scoring is used
+        context = await asyncio.to_thread(
+            self.find_relevant_context, user_question, query_vector=query_vector
+        )
+        
+        if not context:
+            answer = "I'm sorry, I couldn't find relevant information in our FAQ. Please contact our support team for assistance."
+            yield answer
+        else:
+            prompt = ''.join((
+                _PROMPT_PREFIX, context, _PROMPT_QUESTION, user_question,
+                _PROMPT_LANGUAGE, user_language, _PROMPT_SUFFIX
+            ))
             
-            if hasattr(response, 'content'):
-                return response.content.strip()
+            # astream() bypasses the LLM cache, so it is consulted and filled here
+            llm_string = self._llm_string()
+            generations = await self.llm.cache.alookup(prompt, llm_string)
+            if generations:
+                answer = "".join(generation.text for generation in generations).strip()
+                yield answer
             else:
-                return str(response).strip()
-            
-        except Exception as e:
-            print(f"❌ Gemini API error: {e}")
-            return self.fallback_simple_answer(user_question)
+                parts = []
+                async for chunk in self.llm.astream(prompt):
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    parts.append(text)
+                    yield text
+                
+                answer = "".join(parts).strip()
+                if not answer:
+                    return
+                await self.llm.cache.aupdate(prompt, llm_string, [Generation(text="".join(parts))])
+        
+        self.answer_cache.set(cache_key, answer)
+        if query_vector is not None:
+            self.semantic_cache[language].add(query_vector, answer, faq_version)
     
     def fallback_simple_answer(self, user_question):
-        if not self.faq_data:
+        if not self.faq_count:
             return "Sorry, I don't have access to the knowledge base right now."
         
-        best_match = None
-        best_score = 0
         threshold = 0.3
         
-        user_question_clean = re.sub(r'[^\w\s]', '', user_question.lower())
+        user_question_clean = clean_question(user_question)
+        user_words = frozenset(user_question_clean.split())
         
-        for item in self.faq_data:
-            question_similarity = self.similarity(user_question_clean, item['question'])
-            
-            user_words = set(user_question_clean.split())
-            faq_words = set((item['question'] + ' ' + item['answer']).lower().split())
-            word_overlap = len(user_words.intersection(faq_words)) / max(len(user_words), 1)
-            
-            combined_score = (question_similarity * 0.7) + (word_overlap * 0.3)
-            
-            if combined_score > best_score and combined_score > threshold:
-                best_score = combined_score
-                best_match = item
+        # A question matching an FAQ verbatim (ignoring punctuation) is a near-perfect score; skip scoring the rest
+        exact_index = self.question_lookup.get(' '.join(user_question_clean.split()))
+        if exact_index is not None and user_words:
+            return self.answers[exact_index]
+        
+        indices = range(self.faq_count)
+        scores = (self._question_similarities(user_question_clean) * 0.7) + \
+            (self._word_overlaps(user_words, indices) * 0.3)
         
-        if best_match:
-            return best_match['answer']
+        best_index = int(np.argmax(scores))
+        if scores[best_index] > threshold:
+            return self.answers[best_index]
         else:
             return "I'm sorry, I couldn't find a relevant answer to your question. Could you please rephrase or ask something else?"
 
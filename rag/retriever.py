@@ -1,91 +1,88 @@
 import os
-import pandas as pd
-import re
+import functools
+from typing import Tuple
 from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
-from difflib import SequenceMatcher
+from rag.base import BaseFAQRetriever
+from utils.language import detect_language
+from utils.cache import (
+    ExactResponseCache, normalize_text, make_cache_key, get_faq_version, get_llm_cache, get_kb_cache,
+    KB_CACHE_TTL_SECONDS
+)
 
 load_dotenv()
 
-class FAQRetriever:
+# Invariant parts of the FAQ answer prompt, joined around context/question per request
+_PROMPT_PREFIX = """You are a helpful customer support agent for a taxi app company in Saudi Arabia.
+Based on the following FAQ context, answer the user's question. If you cannot find a direct answer,
+provide helpful general information and suggest contacting support at 920000000.
+
+Always respond in the same language as the question. If Arabic, respond in Arabic. If English, respond in English.
+
+FAQ Context:
+"""
+_PROMPT_QUESTION = "\n\nUser Question: "
+_PROMPT_SUFFIX = "\n\nHelpful Answer:"
+
+class FAQRetriever(BaseFAQRetriever):
     def __init__(self):
         self.llm = ChatOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
             model="gpt-4o-mini",
             temperature=0.7,
-            max_tokens=500
+            max_tokens=500,
+            cache=get_llm_cache()
         )
         
-        self.faq_data = []
-        self._load_faq_data()
+        self.answer_cache = ExactResponseCache(maxsize=2048)
+        self.kb_cache = get_kb_cache()
+        super().__init__()
+        if self.faq_count:
+            print(f"FAQ retriever loaded {self.faq_count} Q&A pairs successfully!")
     
-    def _load_faq_data(self):
-        try:
-            df = pd.read_csv('bot-data.csv')
-            self.faq_data = []
-            
-            for _, row in df.iterrows():
-                question = str(row['question']).strip()
-                answer = str(row['answer']).strip()
-                
-                if question != 'nan' and answer != 'nan':
-                    self.faq_data.append({
-                        'question': question,
-                        'answer': answer,
-                        'question_lower': question.lower(),
-                        'keywords': self._extract_keywords(question)
-                    })
-            
-            print(f"FAQ retriever loaded {len(self.faq_data)} Q&A pairs successfully!")
-            
-        except Exception as e:
-            print(f"Error loading FAQ data: {e}")
-            self.faq_data = []
-    
-    def _extract_keywords(self, text):
-        stop_words = {'how', 'what', 'where', 'when', 'why', 'do', 'does', 'can', 'could', 'would', 'should',
-                     'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-                     'كيف', 'ماذا', 'أين', 'متى', 'لماذا', 'هل', 'يمكن', 'في', 'على', 'إلى', 'من', 'مع'}
+    def search_knowledge_base_with_score(self, query: str) -> Tuple[str, float]:
+        """
+        Return the best matching FAQ answer and its similarity score without calling the LLM
+        """
+        matches = self._find_best_matches(query, top_k=1)
+        if not matches:
+            return "", 0.0
         
-        words = re.findall(r'\b\w+\b', text.lower())
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
-        return keywords
+        best_score, best_index = matches[0]
+        return self.answers[best_index], best_score
     
-    def _calculate_similarity(self, query, faq_item):
-        query_lower = query.lower()
-        question_lower = faq_item['question_lower']
-        
-        text_similarity = SequenceMatcher(None, query_lower, question_lower).ratio()
-        
-        query_keywords = set(self._extract_keywords(query))
-        faq_keywords = set(faq_item['keywords'])
-        
-        if query_keywords and faq_keywords:
-            keyword_similarity = len(query_keywords.intersection(faq_keywords)) / len(query_keywords.union(faq_keywords))
-        else:
-            keyword_similarity = 0
+    def get_faq_context(self, query: str, top_k: int = 3) -> str:
+        """
+        Format the top FAQ matches as Q/A pairs for use as LLM context
+        """
+        matches = self._find_best_matches(query, top_k=top_k)
+        if not matches:
+            return "No matching FAQ entries."
         
-        return (text_similarity * 0.6) + (keyword_similarity * 0.4)
+        return "\n".join([f"Q: {self.questions[index]}\nA: {self.answers[index]}" for _, index in matches])
     
-    def _find_best_matches(self, query, top_k=3):
-        if not self.faq_data:
-            return []
-        
-        similarities = []
-        for faq_item in self.faq_data:
-            similarity = self._calculate_similarity(query, faq_item)
-            similarities.append((similarity, faq_item))
-        
-        similarities.sort(key=lambda x: x[0], reverse=True)
+    def search_knowledge_base(self, query: str) -> str:
+        cache_key = make_cache_key(detect_language(query), normalize_text(query), get_faq_version())
+        cached_answer = self.answer_cache.get(cache_key)
+        if cached_answer is not None:
+            return cached_answer
         
-        good_matches = [(score, item) for score, item in similarities if score > 0.1]
+        # Second tier: answers persisted by this or an earlier process
+        cached_answer = self.kb_cache.get(cache_key)
+        if cached_answer is not None:
+            self.answer_cache.set(cache_key, cached_answer)
+            return cached_answer
         
-        return good_matches[:top_k]
+        answer = self._search_knowledge_base(query)
+        # Error replies are not cached so the next request retries
+        if self.faq_count and "technical difficulties" not in answer:
+            self.answer_cache.set(cache_key, answer)
+            self.kb_cache.set(cache_key, answer, expire=KB_CACHE_TTL_SECONDS)
+        return answer
     
-    def search_knowledge_base(self, query: str) -> str:
+    def _search_knowledge_base(self, query: str) -> str:
         try:
-            if not self.faq_data:
+            if not self.faq_count:
                 return "I'm sorry, but I cannot access the knowledge base right now. Please contact our support team at 920000000."
             
             matches = self._find_best_matches(query)
@@ -96,40 +93,32 @@ class FAQRetriever:
                 else:
                     return "I'm sorry, I don't have specific information about that. Please contact our customer support at 920000000 for assistance. / أعتذر، ليس لدي معلومات محددة حول ذلك. يرجى الاتصال بخدمة العملاء على 920000000."
             
-            best_score, best_match = matches[0]
+            best_score, best_index = matches[0]
             
             if best_score > 0.5:
-                return best_match['answer']
+                return self.answers[best_index]
             else:
-                context = "\n".join([f"Q: {item['question']}\nA: {item['answer']}" for _, item in matches])
-                
-                prompt_template = """You are a helpful customer support agent for a taxi app company in Saudi Arabia.
-                Based on the following FAQ context, answer the user's question. If you cannot find a direct answer,
-                provide helpful general information and suggest contacting support at 920000000.
-
-                Always respond in the same language as the question. If Arabic, respond in Arabic. If English, respond in English.
-
-                FAQ Context:
-                {context}
-
-                User Question: {question}
-
-                Helpful Answer:"""
+                context = "\n".join([f"Q: {self.questions[index]}\nA: {self.answers[index]}" for _, index in matches])
                 
-                prompt = PromptTemplate(
-                    template=prompt_template,
-                    input_variables=["context", "question"]
-                )
-                
-                formatted_prompt = prompt.format(context=context, question=query)
-                response = self.llm.invoke(formatted_prompt)
-                return response.content
+                prompt = ''.join((_PROMPT_PREFIX, context, _PROMPT_QUESTION, query, _PROMPT_SUFFIX))
+                return self._llm_invoke(prompt)
             
         except Exception as e:
             print(f"Error searching knowledge base: {e}")
             return "I'm experiencing technical difficulties. Please contact our support team at 920000000. / أواجه صعوبات تقنية. يرجى الاتصال بفريق الدعم على 920000000."
 
-faq_retriever = FAQRetriever()
+@functools.cache
+def get_retriever() -> FAQRetriever:
+    """
+    The shared FAQRetriever, built on first use rather than at import time
+    """
+    return FAQRetriever()
 
 def search_knowledge_base(query: str) -> str:
-    return faq_retriever.search_knowledge_base(query) 
\ No newline at end of file
+    return get_retriever().search_knowledge_base(query)
+
+def search_knowledge_base_with_score(query: str) -> Tuple[str, float]:
+    return get_retriever().search_knowledge_base_with_score(query)
+
+def get_faq_context(query: str, top_k: int = 3) -> str:
+    return get_retriever().get_faq_context(query, top_k)
\ No newline at end of file
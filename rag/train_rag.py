@@ -1,28 +1,156 @@
 import pandas as pd
+import numpy as np
+import math
 import os
+import pickle
+import hashlib
+from pathlib import Path
+import faiss
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.docstore.document import Document
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# text-embedding-3 models are Matryoshka-trained, so a 512-dim prefix keeps most of the recall
+# at a third of the index memory and dot-product work of the full 1536 dims
+EMBEDDING_DIMENSIONS = 512
+# Up to this many vectors an exact IndexFlatIP scan beats walking an HNSW graph
+FLAT_MAX_VECTORS = 1000
+# IVF-PQ needs enough vectors to train its coarse quantizer and PQ codebooks; smaller corpora use HNSW
+IVFPQ_MIN_VECTORS = 10_000
+IVFPQ_SUBQUANTIZERS = 32
+IVFPQ_NPROBE = 8
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# Texts per embeddings request
+EMBEDDING_BATCH_SIZE = 512
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Written by FAISS.save_local: index.faiss (binary FAISS index) and index.pkl (docstore + id map)
+FAQ_INDEX_DIR = Path("taxi_faq_index")
+QUERY_EMBEDDING_CACHE_DIR = Path('.cache/embeddings')
+# FAQ rows at least this similar to an earlier kept row are paraphrases and are not indexed
+DEDUP_SIMILARITY = 0.97
+DEDUP_NEIGHBORS = 8
+
+def semantic_dedup_mask(vectors, threshold=DEDUP_SIMILARITY):
+    """
+    Boolean mask keeping the first of each group of near-duplicate normalized vectors.
+    One batched nearest-neighbour search, then a single pass in row order.
+    """
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    scores, neighbors = index.search(vectors, min(DEDUP_NEIGHBORS, len(vectors)))
+    
+    keep = np.ones(len(vectors), dtype=bool)
+    for i in range(len(vectors)):
+        for score, j in zip(scores[i], neighbors[i]):
+            if 0 <= j < i and score >= threshold and keep[j]:
+                keep[i] = False
+                break
+    return keep
+
+def build_faiss_index(vectors):
+    """
+    Inner-product index over vectors L2-normalized once at build time, so scores are
+    cosine similarity: exact IndexFlatIP for small corpora, HNSW over fp16
+    scalar-quantized vectors for medium ones, IVF-PQ for large ones
+    """
+    count, dimensions = vectors.shape
+    
+    if count <= FLAT_MAX_VECTORS:
+        index = faiss.IndexFlatIP(dimensions)
+    elif count >= IVFPQ_MIN_VECTORS:
+        nlist = max(4, int(4 * math.sqrt(count)))
+        quantizer = faiss.IndexFlatIP(dimensions)
+        index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, IVFPQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        # Vectors stored as fp16: half the memory of flat fp32, SIMD inner-product kernels
+        index = faiss.IndexHNSWSQ(dimensions, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.train(vectors)
+    
+    index.add(vectors)
+    tune_faiss_index(index)
+    return index
+
+def tune_faiss_index(index):
+    """
+    Apply query-time search parameters, which are not all persisted with the index
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = IVFPQ_NPROBE
+    return index
+
+def embed_queries_cached(embeddings, queries):
+    """
+    Embed queries, reusing vectors saved under QUERY_EMBEDDING_CACHE_DIR by earlier runs;
+    only the misses go to the API, in one request
+    """
+    paths = [
+        QUERY_EMBEDDING_CACHE_DIR / f"{hashlib.sha1(f'{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}:{query}'.encode('utf-8')).hexdigest()}.npy"
+        for query in queries
+    ]
+    vectors = [np.load(path) if path.exists() else None for path in paths]
+    
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        QUERY_EMBEDDING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fresh = embeddings.embed_documents([queries[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = np.asarray(vector, dtype=np.float32)
+            np.save(paths[i], vectors[i])
+    
+    return np.vstack(vectors).astype(np.float32)
+
+def load_faq_vectorstore(embeddings):
+    """
+    Load the store saved by create_faq_index, memory-mapping the FAISS index read-only
+    so only the parts a search touches are paged in. Index types FAISS can't mmap are
+    read into memory as usual.
+    """
+    index_path = str(FAQ_INDEX_DIR / "index.faiss")
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(index_path)
+    tune_faiss_index(index)
+    
+    with open(FAQ_INDEX_DIR / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+
 def create_faq_index():
     try:
-        df = pd.read_csv('bot-data.csv')
+        df = pd.read_csv('bot-data.csv', engine='pyarrow', dtype_backend='pyarrow', usecols=['question', 'answer'])
         print(f"Loaded {len(df)} Q&A pairs from bot-data.csv")
         
-        documents = []
-        for index, row in df.iterrows():
-            question = str(row['question']).strip()
-            answer = str(row['answer']).strip()
-            
-            if not question or not answer or question == 'nan' or answer == 'nan':
-                continue
-            
-            content = f"Question: {question}\nAnswer: {answer}"
-            doc = Document(
+        df = df.dropna()
+        questions = df['question'].str.strip()
+        answers = df['answer'].str.strip()
+        mask = (questions != '') & (answers != '')
+        questions, answers = questions[mask], answers[mask]
+        contents = ("Question: " + questions + "\nAnswer: " + answers).tolist()
+        
+        documents = [
+            Document(
                 page_content=content,
                 metadata={
                     "question": question,
@@ -31,7 +159,10 @@ def create_faq_index():
                     "source": "taxi_faq"
                 }
             )
-            documents.append(doc)
+            for content, index, question, answer in zip(
+                contents, questions.index.tolist(), questions.tolist(), answers.tolist()
+            )
+        ]
         
         print(f"Created {len(documents)} valid documents from FAQ data")
         
@@ -41,19 +172,37 @@ def create_faq_index():
         
         embeddings = OpenAIEmbeddings(
             api_key=os.getenv("OPENAI_API_KEY"),
-            model="text-embedding-3-small",
-            dimensions=1536
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS
         )
         
         print("Creating vector embeddings...")
         
-        vectorstore = FAISS.from_documents(
-            documents, 
-            embeddings,
-            distance_strategy="COSINE"
+        vectors = np.asarray(
+            embeddings.embed_documents([doc.page_content for doc in documents], chunk_size=EMBEDDING_BATCH_SIZE),
+            dtype=np.float32
         )
+        faiss.normalize_L2(vectors)
         
-        vectorstore.save_local("taxi_faq_index")
+        keep = semantic_dedup_mask(vectors)
+        if not keep.all():
+            print(f"🧹 Dropped {int((~keep).sum())} near-duplicate FAQ rows (cosine >= {DEDUP_SIMILARITY})")
+            vectors = vectors[keep]
+            documents = [doc for doc, kept in zip(documents, keep) if kept]
+        
+        index = build_faiss_index(vectors)
+        print(f"📐 Built {type(index).__name__} over {index.ntotal} vectors")
+        
+        docstore_ids = [str(i) for i in range(len(documents))]
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(docstore_ids, documents))),
+            index_to_docstore_id=dict(enumerate(docstore_ids)),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        
+        vectorstore.save_local(str(FAQ_INDEX_DIR))
         
         print("✅ FAISS index created and saved successfully!")
         print(f"📊 Index contains {len(documents)} documents")
@@ -73,14 +222,11 @@ def test_retrieval():
     try:
         embeddings = OpenAIEmbeddings(
             api_key=os.getenv("OPENAI_API_KEY"),
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS
         )
         
-        vectorstore = FAISS.load_local(
-            "taxi_faq_index", 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
+        vectorstore = load_faq_vectorstore(embeddings)
         
         test_queries = [
             "How do I book a taxi?",
@@ -92,9 +238,17 @@ def test_retrieval():
         print("\n🧪 Testing retrieval system:")
         print("=" * 50)
         
-        for query in test_queries:
+        # At most one embeddings request (none once cached) and one index search for all queries
+        query_vectors = embed_queries_cached(embeddings, test_queries)
+        faiss.normalize_L2(query_vectors)
+        _, ids = vectorstore.index.search(query_vectors, 2)
+        
+        for query, query_ids in zip(test_queries, ids):
             print(f"\nQuery: {query}")
-            docs = vectorstore.similarity_search(query, k=2)
+            docs = [
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)])
+                for i in query_ids if i >= 0
+            ]
             for i, doc in enumerate(docs, 1):
                 print(f"  Result {i}: {doc.metadata['question'][:100]}...")
         
@@ -1,35 +1,55 @@
 #!/usr/bin/env python3
 
 import pandas as pd
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process
+from sklearn.feature_extraction.text import TfidfVectorizer
 import re
 
 class SimpleChatBot:
+    PUNCT_RE = re.compile(r'[^\w\s]')
+    
     def __init__(self):
         self.faq_data = self.load_faq_data()
         print(f"✅ Loaded {len(self.faq_data)} FAQ entries")
+        
+        # Character n-grams within word boundaries cope with typos and Arabic affixes;
+        # rows are L2-normalized, so a sparse dot product is the cosine similarity
+        self.vectorizer = None
+        self.faq_matrix = None
+        if self.faq_data:
+            self.vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), lowercase=False)
+            self.faq_matrix = self.vectorizer.fit_transform(
+                [item['q_clean'] + ' ' + item['a_clean'] for item in self.faq_data]
+            )
+        self.choices = [item['q_clean'] for item in self.faq_data]
     
     def load_faq_data(self):
         try:
-            df = pd.read_csv('bot-data.csv')
+            df = pd.read_csv('bot-data.csv', engine='pyarrow', dtype_backend='pyarrow')
             print(f"📊 CSV columns: {list(df.columns)}")
             
+            question_col = answer_col = None
+            for col in df.columns:
+                col_lower = col.lower().strip()
+                if 'question' in col_lower or 'q' == col_lower:
+                    question_col = col
+                elif 'answer' in col_lower or 'a' == col_lower or 'response' in col_lower:
+                    answer_col = col
+            if question_col is None or answer_col is None:
+                return []
+            
+            # Arrow string columns: missing cells are <NA>, so fill before stripping
+            questions = df[question_col].fillna('').astype(str).str.strip()
+            answers = df[answer_col].fillna('').astype(str).str.strip()
+            
             faq_data = []
-            for _, row in df.iterrows():
-                question = ""
-                answer = ""
-                
-                for col in df.columns:
-                    col_lower = col.lower().strip()
-                    if 'question' in col_lower or 'q' == col_lower:
-                        question = str(row[col]).strip()
-                    elif 'answer' in col_lower or 'a' == col_lower or 'response' in col_lower:
-                        answer = str(row[col]).strip()
-                
-                if question and answer and question != 'nan' and answer != 'nan':
+            for question, answer in zip(questions.tolist(), answers.tolist()):
+                if question and answer:
                     faq_data.append({
                         'question': question,
-                        'answer': answer
+                        'answer': answer,
+                        'q_clean': self.clean(question),
+                        'a_clean': self.clean(answer)
                     })
             
             return faq_data
@@ -37,30 +57,33 @@ class SimpleChatBot:
             print(f"❌ Error loading FAQ data: {e}")
             return []
     
-    def similarity(self, a, b):
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    @classmethod
+    def clean(cls, text):
+        """
+        Lowercase and strip punctuation; applied once per FAQ at load and once per query
+        """
+        return cls.PUNCT_RE.sub('', text.lower())
     
     def find_best_answer(self, user_question, threshold=0.3):
         if not self.faq_data:
             return "Sorry, I don't have access to the knowledge base right now."
         
-        best_match = None
-        best_score = 0
+        user_question_clean = self.clean(user_question)
+        query_vector = self.vectorizer.transform([user_question_clean])
+        scores = (self.faq_matrix @ query_vector.T).toarray().ravel()
+        best_index = scores.argmax()
+        best_score = scores[best_index]
+        best_match = self.faq_data[best_index] if best_score > threshold else None
         
-        user_question_clean = re.sub(r'[^\w\s]', '', user_question.lower())
-        
-        for item in self.faq_data:
-            question_similarity = self.similarity(user_question_clean, item['question'])
-            
-            user_words = set(user_question_clean.split())
-            faq_words = set((item['question'] + ' ' + item['answer']).lower().split())
-            word_overlap = len(user_words.intersection(faq_words)) / max(len(user_words), 1)
-            
-            combined_score = (question_similarity * 0.7) + (word_overlap * 0.3)
-            
-            if combined_score > best_score and combined_score > threshold:
-                best_score = combined_score
-                best_match = item
+        # Short or misspelled questions can miss on n-gram overlap; fall back to fuzzy question matching
+        if best_match is None:
+            fuzzy = process.extractOne(
+                user_question_clean, self.choices, scorer=fuzz.WRatio, score_cutoff=threshold * 100
+            )
+            if fuzzy is not None:
+                _, fuzzy_score, fuzzy_index = fuzzy
+                best_match = self.faq_data[fuzzy_index]
+                best_score = fuzzy_score / 100.0
         
         if best_match:
             return f"{best_match['answer']}\n\n(Confidence: {best_score:.2f})"
@@ -90,4 +113,16 @@ class SimpleChatBot:
                 print(f"Bot: I have {len(self.faq_data)} FAQ entries in my knowledge base.")
                 continue
             elif not user_input:
-                print("Bot: Please ask 
\ No newline at end of file
+                print("Bot: Please ask a question or type 'help' for available commands.")
+                continue
+            
+            response = self.find_best_answer(user_input)
+            print(f"Bot: {response}")
+            print()
+
+if __name__ == "__main__":
+    try:
+        bot = SimpleChatBot()
+        bot.chat()
+    except (KeyboardInterrupt, EOFError):
+        print("\nBot: Goodbye! 👋")
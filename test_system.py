@@ -4,7 +4,9 @@ Test script to verify all system components work correctly
 """
 
 import os
+import argparse
 from dotenv import load_dotenv
+from utils.parallel_checks import run_checks_parallel
 
 def test_environment():
     """Test if environment variables are set"""
@@ -143,28 +145,34 @@ def test_customer_agent():
         print(f"❌ Customer agent failed: {e}")
         return False
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Verify the chatbot system components")
+    parser.add_argument(
+        "--skip-openai",
+        action="store_true",
+        help="skip the OpenAI connection test (and the LangChain import it needs)"
+    )
+    return parser.parse_args()
+
 def main():
     """Run all tests"""
+    args = parse_args()
+    
     print("🚀 Testing WhatsApp Customer Support Chatbot System")
     print("=" * 60)
     
-    tests = [
-        ("Environment Setup", test_environment),
-        ("OpenAI Connection", test_openai_connection),
+    # The environment check loads .env, so it runs before the others
+    results = [("Environment Setup", test_environment())]
+    
+    # The remaining checks are independent and mostly wait on the network; run them concurrently
+    tests = [] if args.skip_openai else [("OpenAI Connection", test_openai_connection)]
+    tests += [
         ("Database Connection", test_database_connection),
         ("Language Detection", test_language_detection),
         ("FAQ Retrieval", test_faq_retriever),
         ("Customer Agent", test_customer_agent),
     ]
-    
-    results = []
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} crashed: {e}")
-            results.append((test_name, False))
+    results += run_checks_parallel(tests)
     
     # Summary
     print("\n" + "=" * 60)
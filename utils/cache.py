@@ -0,0 +1,125 @@
+import os
+import re
+import hashlib
+import threading
+import functools
+from typing import Optional
+import numpy as np
+import faiss
+from cachetools import LRUCache
+
+FAQ_CSV_PATH = 'bot-data.csv'
+LLM_CACHE_PATH = '.llm_cache.sqlite'
+KB_CACHE_DIR = '.cache/kb'
+# Knowledge-base answers persisted on disk expire after a day even if the FAQ CSV is unchanged
+KB_CACHE_TTL_SECONDS = 86_400
+
+_DIACRITICS_RE = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a message for cache lookups: lowercase, strip Arabic
+    diacritics/tatweel and punctuation, collapse whitespace
+    """
+    text = _DIACRITICS_RE.sub('', text.lower())
+    text = _PUNCT_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+def get_faq_version() -> str:
+    """
+    Version tag for cached answers; changes whenever the FAQ CSV is modified
+    """
+    try:
+        return str(os.stat(FAQ_CSV_PATH).st_mtime_ns)
+    except OSError:
+        return "0"
+
+def make_cache_key(language: str, normalized_text: str, faq_version: str) -> str:
+    digest = hashlib.sha1(normalized_text.encode('utf-8')).hexdigest()
+    return f"{faq_version}:{language}:{digest}"
+
+class ExactResponseCache:
+    """
+    Thread-safe LRU of responses keyed by make_cache_key()
+    """
+    def __init__(self, maxsize: int = 10_000):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: str, response: str):
+        with self._lock:
+            self._cache[key] = response
+
+class SemanticResponseCache:
+    """
+    Nearest-neighbour response cache over L2-normalized query embeddings.
+    A lookup hits when the inner product (cosine similarity) with a stored
+    query is at least `threshold`.
+    """
+    def __init__(self, threshold: float = 0.93, max_entries: int = 10_000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.faq_version = None
+        self._index = None
+        self._responses = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _as_query(vector) -> np.ndarray:
+        query = np.asarray(vector, dtype='float32').reshape(1, -1)
+        faiss.normalize_L2(query)
+        return query
+
+    def _reset(self, faq_version: str):
+        if self._index is not None:
+            self._index.reset()
+        self._responses = []
+        self.faq_version = faq_version
+
+    def lookup(self, vector, faq_version: str) -> Optional[str]:
+        with self._lock:
+            if faq_version != self.faq_version:
+                self._reset(faq_version)
+                return None
+            if self._index is None or self._index.ntotal == 0:
+                return None
+
+            scores, ids = self._index.search(self._as_query(vector), 1)
+            if ids[0][0] >= 0 and scores[0][0] >= self.threshold:
+                return self._responses[ids[0][0]]
+            return None
+
+    def add(self, vector, response: str, faq_version: str):
+        with self._lock:
+            query = self._as_query(vector)
+            if faq_version != self.faq_version or len(self._responses) >= self.max_entries:
+                self._reset(faq_version)
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(query.shape[1])
+            self._index.add(query)
+            self._responses.append(response)
+
+@functools.cache
+def get_llm_cache():
+    """
+    Process-wide LangChain cache of LLM generations persisted to SQLite, so
+    identical prompts are answered from disk even across restarts. Pass it as
+    `cache=` to individual models rather than installing it globally.
+    """
+    from langchain_community.cache import SQLiteCache
+    return SQLiteCache(database_path=LLM_CACHE_PATH)
+
+@functools.cache
+def get_kb_cache():
+    """
+    Process-wide diskcache of knowledge-base answers keyed by make_cache_key(),
+    shared between processes and kept across restarts
+    """
+    from diskcache import Cache
+    return Cache(KB_CACHE_DIR)
@@ -1,27 +1,22 @@
-from langdetect.lang_detect_exception import LangDetectException
+import re
+from functools import lru_cache
 
-# Set seed for consistent results
-DetectorFactory.seed = 0
+# Arabic, Arabic Supplement and the Arabic presentation-form blocks
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]')
+# Share of Arabic characters above which a message counts as Arabic
+_ARABIC_RATIO = 0.2
 
+@lru_cache(maxsize=4096)
 def detect_language(text: str) -> str:
     """
     Detect the language of the input text
     Returns 'ar' for Arabic, 'en' for English, defaults to 'en' for unknown
     """
-    try:
-        if not text or len(text.strip()) < 3:
-            return 'en'  # Default to English for very short texts
-        
-        detected = detect(text)
-        
-        # Map detected languages to our supported ones
-        if detected == 'ar':
-            return 'ar'
-        else:
-            return 'en'  # Default to English for all other languages
-            
-    except LangDetectException:
-        return 'en'  # Default to English if detection fails
+    if not text or len(text.strip()) < 3:
+        return 'en'  # Default to English for very short texts
+    
+    # Only Arabic vs English matters here, so a script count is enough
+    return 'ar' if len(_ARABIC_RE.findall(text)) / len(text) > _ARABIC_RATIO else 'en'
 
 def is_arabic(text: str) -> bool:
     """
@@ -29,6 +24,7 @@ def is_arabic(text: str) -> bool:
     """
     return detect_language(text) == 'ar'
 
+@lru_cache(maxsize=None)
 def get_language_name(lang_code: str) -> str:
     """
     Get human-readable language name
@@ -37,4 +33,4 @@ def get_language_name(lang_code: str) -> str:
         'ar': 'Arabic',
         'en': 'English'
     }
-    return language_names.get(lang_code, 'English') 
\ No newline at end of file
+    return language_names.get(lang_code, 'English')
\ No newline at end of file
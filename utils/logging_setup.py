@@ -0,0 +1,49 @@
+import os
+import queue
+import atexit
+import logging
+import logging.handlers
+import orjson
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line; a `data` extra (logger.debug("...", extra={"data": ...}))
+    is included as structured data
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if hasattr(record, "data"):
+            payload["data"] = record.data
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(payload, default=str).decode()
+
+def configure_logging():
+    """
+    Route all logging through a QueueHandler so the request path only enqueues
+    records; a QueueListener thread formats and writes them to stderr.
+    Level comes from LOG_LEVEL (default INFO).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
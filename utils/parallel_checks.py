@@ -0,0 +1,52 @@
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+class _ThreadBufferedStdout(io.TextIOBase):
+    """
+    sys.stdout stand-in that sends each worker thread's prints to its own buffer,
+    so concurrent checks don't interleave their output
+    """
+    def __init__(self, target):
+        self.target = target
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.target).write(text)
+
+    def flush(self):
+        self.target.flush()
+
+def run_checks_parallel(checks: List[Tuple[str, Callable[[], bool]]], max_workers: int = 6) -> List[Tuple[str, bool]]:
+    """
+    Run independent (name, check) callables concurrently and return (name, passed)
+    in the given order. Each check's output is printed in order once all have finished;
+    a check that raises counts as failed.
+    """
+    stdout = _ThreadBufferedStdout(sys.stdout)
+
+    def run(check):
+        name, func = check
+        stdout.local.buffer = io.StringIO()
+        try:
+            result = bool(func())
+        except Exception as e:
+            print(f"❌ {name} crashed: {e}")
+            result = False
+        return name, result, stdout.local.buffer.getvalue()
+
+    sys.stdout = stdout
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(run, checks))
+    finally:
+        sys.stdout = stdout.target
+
+    results = []
+    for name, result, output in outcomes:
+        print(output, end="")
+        results.append((name, result))
+    return results
@@ -1,68 +1,133 @@
 import requests
+import httpx
 import os
-import json
-from typing import Dict, Any
+import logging
+import orjson
+from typing import Dict, Any, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Graph API endpoint, auth headers and verify token are fixed for the process; read them once
+_MESSAGES_URL = f"https://graph.facebook.com/v18.0/{os.getenv('META_PHONE_NUMBER_ID')}/messages"
+_HEADERS = {
+    "Authorization": f"Bearer {os.getenv('META_TOKEN')}",
+    "Content-Type": "application/json"
+}
+_VERIFY_TOKEN = os.getenv("WEBHOOK_VERIFY_TOKEN")
+
+# Constant parts of a text message's JSON body; only the recipient and text are encoded per send
+# (orjson.dumps of a str yields a quoted, escaped JSON string)
+_TEXT_PAYLOAD_PREFIX = b'{"messaging_product":"whatsapp","type":"text","to":'
+_TEXT_PAYLOAD_BODY = b',"text":{"body":'
+_TEXT_PAYLOAD_SUFFIX = b'}}'
+
+# Shared client so replies reuse pooled (HTTP/2) connections to the Graph API
+# instead of paying a TCP+TLS handshake per message; closed on app shutdown
+_async_client = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+)
+
+# Same for the synchronous path: one pooled keep-alive session. Retries cover connection
+# failures and the statuses Meta uses for "not processed, try later"; a POST that may have
+# reached the API is not resent, to avoid delivering a reply twice.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=(429, 503),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False
+    )
+))
+
+async def close_whatsapp_client():
+    await _async_client.aclose()
+
+def _build_text_message(to: str, message: str):
+    """
+    URL, headers and JSON body of a Graph API text message, shared by the sync and async senders
+    """
+    return _MESSAGES_URL, _HEADERS, b"".join((
+        _TEXT_PAYLOAD_PREFIX, orjson.dumps(to), _TEXT_PAYLOAD_BODY, orjson.dumps(message), _TEXT_PAYLOAD_SUFFIX
+    ))
 
 def send_whatsapp_reply_meta(to: str, message: str) -> bool:
     try:
-        url = f"https://graph.facebook.com/v18.0/{os.getenv('META_PHONE_NUMBER_ID')}/messages"
+        url, headers, body = _build_text_message(to, message)
         
-        headers = {
-            "Authorization": f"Bearer {os.getenv('META_TOKEN')}",
-            "Content-Type": "application/json"
-        }
+        response = _session.post(url, headers=headers, data=body, timeout=(3.05, 10))
         
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to,
-            "type": "text",
-            "text": {
-                "body": message
-            }
-        }
+        if response.ok:
+            logger.info("Message sent successfully to %s", to)
+            return True
+        else:
+            logger.error("Failed to send message: %s - %s", response.status_code, response.text)
+            return False
+            
+    except Exception as e:
+        logger.exception("Error sending WhatsApp message: %s", e)
+        return False
+
+async def send_whatsapp_reply_meta_async(to: str, message: str) -> bool:
+    try:
+        url, headers, body = _build_text_message(to, message)
         
-        response = requests.post(url, headers=headers, json=payload)
+        response = await _async_client.post(url, headers=headers, content=body)
         
-        if response.status_code == 200:
-            print(f"Message sent successfully to {to}")
+        if response.is_success:
+            logger.info("Message sent successfully to %s", to)
             return True
         else:
-            print(f"Failed to send message: {response.status_code} - {response.text}")
+            logger.error("Failed to send message: %s - %s", response.status_code, response.text)
             return False
             
     except Exception as e:
-        print(f"Error sending WhatsApp message: {e}")
+        logger.exception("Error sending WhatsApp message: %s", e)
         return False
 
 def verify_webhook(mode: str, token: str, challenge: str) -> str:
-    verify_token = os.getenv("WEBHOOK_VERIFY_TOKEN")
-    
-    if mode == "subscribe" and token == verify_token:
-        print("Webhook verified successfully!")
+    if mode == "subscribe" and token == _VERIFY_TOKEN:
+        logger.info("Webhook verified successfully")
         return challenge
     else:
-        print("Webhook verification failed!")
+        logger.warning("Webhook verification failed")
         return ""
 
-def parse_whatsapp_message(data: Dict[Any, Any]) -> Dict[str, str]:
-    try:
-        entry = data.get("entry", [{}])[0]
-        changes = entry.get("changes", [{}])[0]
-        value = changes.get("value", {})
-        
-        if "messages" in value:
-            message = value["messages"][0]
-            contact = value["contacts"][0]
-            
-            return {
-                "user_id": message["from"],
-                "user_name": contact["profile"]["name"],
-                "message": message["text"]["body"],
-                "message_id": message["id"],
-                "timestamp": message["timestamp"]
+def parse_whatsapp_message(data: Dict[Any, Any]) -> List[Dict[str, str]]:
+    """
+    Every text message in a webhook delivery; Meta may batch several messages,
+    changes and entries into one POST. Messages that can't be parsed are skipped.
+    """
+    messages = []
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            names = {
+                contact.get("wa_id"): contact.get("profile", {}).get("name", "")
+                for contact in value.get("contacts", [])
             }
-    except (KeyError, IndexError) as e:
-        print(f"Error parsing WhatsApp message: {e}")
-        return {}
+            
+            for message in value.get("messages", []):
+                try:
+                    messages.append({
+                        "user_id": message["from"],
+                        "user_name": names.get(message["from"], ""),
+                        "message": message["text"]["body"],
+                        "message_id": message["id"],
+                        "timestamp": message["timestamp"]
+                    })
+                except (KeyError, TypeError) as e:
+                    logger.warning("Error parsing WhatsApp message: %s", e)
     
-    return {}
\ No newline at end of file
+    return messages
\ No newline at end of file
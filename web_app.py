@@ -1,69 +1,310 @@
 #!/usr/bin/env python3
 
 from flask import Flask, render_template, request, jsonify
-import pandas as pd
-from difflib import SequenceMatcher
+import csv
+import numpy as np
+from rapidfuzz import fuzz, process
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
 import re
 import os
+import functools
+from types import SimpleNamespace
+import logging
 from dotenv import load_dotenv
+from rag.base import build_vocab, pack_token_sets, load_or_build_pickled, HNSW_MIN_ENTRIES
+from utils.logging_setup import configure_logging
+from utils.language import detect_language
+from utils.cache import ExactResponseCache, normalize_text, make_cache_key, get_faq_version, FAQ_CSV_PATH
 
 try:
     from rag.gemini_retriever import GeminiFAQRetriever
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
 
 load_dotenv()
+configure_logging()
+
+logger = logging.getLogger(__name__)
+
+# TF-IDF rows are reduced to this many LSA dimensions for the HNSW graph
+LSA_DIMENSIONS = 256
+# HNSW candidates re-scored with the exact TF-IDF cosine
+HNSW_CANDIDATES = 10
+# Preprocessed FAQ data (parsed rows, bitsets, fitted TF-IDF) pickled next to the CSV per content hash;
+# bump the version when build_faq_index's output changes
+WEB_FAQ_CACHE_VERSION = 1
+WEB_FAQ_CACHE_PATTERN = '.faq_cache_web_v{version}_{digest}.pkl'
 
 app = Flask(__name__)
 
 class WebChatBot:
+    PUNCT_RE = re.compile(r'[^\w\s]')
+    
     def __init__(self):
-        self.faq_data = self.load_faq_data()
+        try:
+            faq_index = load_or_build_pickled(FAQ_CSV_PATH, WEB_FAQ_CACHE_PATTERN, WEB_FAQ_CACHE_VERSION, self.build_faq_index)
+        except OSError as e:
+            logger.error("Error loading FAQ data: %s", e)
+            faq_index = self.build_faq_index(FAQ_CSV_PATH)
+        self.faq_data = faq_index.faq_data
+        self.questions_clean = faq_index.questions_clean
+        self.word_vocab = faq_index.word_vocab
+        self.word_masks = faq_index.word_masks
+        self.vectorizer = faq_index.vectorizer
+        self.faq_matrix = faq_index.faq_matrix
+        
+        self.svd = None
+        self.faq_hnsw = None
+        if FAISS_AVAILABLE and len(self.faq_data) >= HNSW_MIN_ENTRIES:
+            self.build_hnsw_index()
+        self.response_cache = ExactResponseCache(maxsize=2048)
         self.gemini_retriever = None
         
         if GEMINI_AVAILABLE and self.is_gemini_key_valid():
             try:
                 self.gemini_retriever = GeminiFAQRetriever()
-                print("✅ Gemini-powered retriever initialized")
+                logger.info("Gemini-powered retriever initialized")
             except Exception as e:
-                print(f"⚠️ Gemini retriever failed to initialize: {e}")
-                print("📝 Falling back to simple text matching")
+                logger.warning("Gemini retriever failed to initialize, falling back to simple text matching: %s", e)
         else:
-            print("📝 Using simple text matching (Gemini not available or API key not set)")
+            logger.info("Using simple text matching (Gemini not available or API key not set)")
+    
+    def build_faq_index(self, csv_path):
+        """
+        Parse the FAQ CSV and precompute everything matching needs; cached on disk by the caller
+        """
+        faq_data = self.load_faq_data(csv_path)
+        
+        # Each FAQ's word set as a fixed-width bitset, so overlaps are AND + popcount over all rows
+        word_sets = [item['combined_words'] for item in faq_data]
+        word_vocab = build_vocab(word_sets)
+        
+        vectorizer = None
+        faq_matrix = None
+        if faq_data:
+            vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), lowercase=False)
+            faq_matrix = vectorizer.fit_transform(
+                [self.clean(item['question'] + ' ' + item['answer']) for item in faq_data]
+            )
+        
+        return SimpleNamespace(
+            faq_data=faq_data,
+            questions_clean=np.array([item['question_clean'] for item in faq_data], dtype=object),
+            word_vocab=word_vocab,
+            word_masks=pack_token_sets(word_sets, word_vocab),
+            vectorizer=vectorizer,
+            faq_matrix=faq_matrix
+        )
     
     def is_gemini_key_valid(self):
         api_key = os.getenv("GEMINI_API_KEY")
         return api_key and not api_key.startswith("your_") and len(api_key) > 10
     
-    def load_faq_data(self):
+    def load_faq_data(self, csv_path=FAQ_CSV_PATH):
         try:
-            df = pd.read_csv('bot-data.csv')
             faq_data = []
-            
-            for _, row in df.iterrows():
-                question = ""
-                answer = ""
+            with open(csv_path, newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
                 
-                for col in df.columns:
+                question_col = answer_col = None
+                for col in reader.fieldnames or []:
                     col_lower = col.lower().strip()
                     if 'question' in col_lower or 'q' == col_lower:
-                        question = str(row[col]).strip()
+                        question_col = col
                     elif 'answer' in col_lower or 'a' == col_lower or 'response' in col_lower:
-                        answer = str(row[col]).strip()
+                        answer_col = col
+                if question_col is None or answer_col is None:
+                    return []
                 
-                if question and answer and question != 'nan' and answer != 'nan':
+                for row in reader:
+                    question = (row.get(question_col) or "").strip()
+                    answer = (row.get(answer_col) or "").strip()
+                    if not (question and answer):
+                        continue
+                    
+                    # Everything per-FAQ that matching needs is computed here, once, not per query
                     faq_data.append({
                         'question': question,
-                        'answer': answer
+                        'answer': answer,
+                        'question_clean': self.clean(question),
+                        'combined_words': frozenset(self.clean(question + ' ' + answer).split())
                     })
             
             return faq_data
         except Exception as e:
-            print(f"❌ Error loading FAQ data: {e}")
+            logger.error("Error loading FAQ data: %s", e)
             return []
     
-    def similarity(self, a, b):
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    def build_hnsw_index(self):
+        """
+        FAISS HNSW graph over LSA-reduced, normalized TF-IDF rows, so large FAQs are searched
+        sub-linearly; the graph only proposes candidates, which are re-scored exactly
+        """
+        try:
+            self.svd = TruncatedSVD(n_components=min(LSA_DIMENSIONS, self.faq_matrix.shape[1] - 1), random_state=0)
+            vectors = self.svd.fit_transform(self.faq_matrix).astype(np.float32)
+            faiss.normalize_L2(vectors)
+            index = faiss.IndexHNSWFlat(vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.add(vectors)
+            self.faq_hnsw = index
+        except Exception as e:
+            self.svd = None
+            logger.warning("HNSW index unavailable, using linear scan: %s", e)
+    
+    def tfidf_best_match(self, query_vector):
+        """
+        (index, cosine) of the FAQ whose TF-IDF row best matches the query vector
+        """
+        if self.faq_hnsw is not None:
+            reduced = self.svd.transform(query_vector).astype(np.float32)
+            faiss.normalize_L2(reduced)
+            _, ids = self.faq_hnsw.search(reduced, HNSW_CANDIDATES)
+            candidates = ids[0][ids[0] >= 0]
+            if len(candidates):
+                scores = (self.faq_matrix[candidates] @ query_vector.T).toarray().ravel()
+                best = int(scores.argmax())
+                return int(candidates[best]), float(scores[best])
+        
+        scores = (self.faq_matrix @ query_vector.T).toarray().ravel()
+        best_index = int(scores.argmax())
+        return best_index, float(scores[best_index])
+    
+    @classmethod
+    def clean(cls, text):
+        """
+        Lowercase and strip punctuation; applied once per FAQ at load and once per query
+        """
+        return cls.PUNCT_RE.sub('', text.lower())
+    
+    def simple_find_answer(self, user_question, threshold=0.3):
+        """
+        Best FAQ answer by question similarity and word overlap; returns (answer, confidence)
+        """
+        if not self.faq_data:
+            return "Sorry, I don't have access to the knowledge base right now.", 0.0
+        
+        user_question_clean = self.clean(user_question)
+        
+        best_index, tfidf_score = self.tfidf_best_match(self.vectorizer.transform([user_question_clean]))
+        if tfidf_score > threshold:
+            return self.faq_data[best_index]['answer'], tfidf_score
+        
+        # Below the TF-IDF threshold, fall back to fuzzy question similarity plus word overlap
+        user_words = frozenset(user_question_clean.split())
+        
+        # Word overlap is the cheap term, so it is computed first
+        query_mask = pack_token_sets([[word for word in user_words if word in self.word_vocab]], self.word_vocab)[0]
+        word_overlaps = np.bitwise_count(self.word_masks & query_mask).sum(axis=1) / max(len(user_words), 1)
+        
+        # A FAQ sharing no words only clears the threshold if question similarity alone exceeds
+        # threshold / 0.7; as a score_cutoff that lets rapidfuzz abandon those rows early
+        question_sims = np.zeros(len(self.faq_data))
+        has_overlap = word_overlaps > 0
+        for rows, cutoff in ((has_overlap, 0), (~has_overlap, min(threshold / 0.7, 1.0) * 100)):
+            rows = np.flatnonzero(rows)
+            if len(rows):
+                question_sims[rows] = process.cdist(
+                    [user_question_clean], self.questions_clean[rows], scorer=fuzz.ratio, score_cutoff=cutoff
+                )[0] / 100.0
+        
+        scores = question_sims * 0.7 + word_overlaps * 0.3
+        best_index = int(scores.argmax())
+        best_score = float(scores[best_index])
+        best_match = self.faq_data[best_index]
+        
+        if best_match and best_score > threshold:
+            return best_match['answer'], best_score
+        return "I'm sorry, I couldn't find a relevant answer to your question. Could you please rephrase or ask something else?", best_score
+    
+    def get_response(self, user_message):
+        cache_key = make_cache_key(detect_language(user_message), normalize_text(user_message), get_faq_version())
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        result, cacheable = self._get_response(user_message)
+        if cacheable:
+            self.response_cache.set(cache_key, result)
+        # Callers may add fields to the result; the cached dict stays untouched
+        return dict(result)
     
-    def simple_find_answer(self, user_question,
\ No newline at end of file
+    def _get_response(self, user_message):
+        """
+        (result, cacheable); a simple-matching answer given because Gemini failed is not
+        cached, so the next identical question tries Gemini again
+        """
+        if self.gemini_retriever:
+            try:
+                # Gemini errors raise here rather than coming back as its own keyword fallback
+                answer = self.gemini_retriever.get_answer(user_message, fallback=False)
+                return {
+                    'response': answer,
+                    'method': 'Google Gemini',
+                    'confidence': 0.95
+                }, True
+            except Exception as e:
+                logger.warning("Gemini failed, using simple matching: %s", e)
+        
+        answer, confidence = self.simple_find_answer(user_message)
+        return {
+            'response': answer,
+            'method': 'Simple Text Matching',
+            'confidence': confidence
+        }, self.gemini_retriever is None
+
+@functools.cache
+def get_chatbot() -> WebChatBot:
+    """
+    The shared WebChatBot, built on first use rather than at import time
+    """
+    return WebChatBot()
+
+@app.route('/')
+def index():
+    chatbot = get_chatbot()
+    return render_template(
+        'chat.html',
+        total_faqs=len(chatbot.faq_data),
+        gemini_available=chatbot.gemini_retriever is not None
+    )
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    try:
+        data = request.get_json(silent=True) or {}
+        user_message = str(data.get('message', '')).strip()
+        
+        if not user_message:
+            return jsonify({'error': True, 'response': 'Please enter a message'}), 400
+        
+        result = get_chatbot().get_response(user_message)
+        result['error'] = False
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.exception("Error processing chat: %s", e)
+        return jsonify({'error': True, 'response': str(e)}), 500
+
+@app.route('/api/status')
+def status():
+    chatbot = get_chatbot()
+    return jsonify({
+        'status': 'online',
+        'total_faqs': len(chatbot.faq_data),
+        'gemini_available': chatbot.gemini_retriever is not None
+    })
+
+if __name__ == '__main__':
+    print("🚀 Starting web chat interface...")
+    print("🌐 Open http://localhost:5000 in your browser")
+    # Local testing only; deployments run `gunicorn -k gthread web_app:app` (see Procfile).
+    # FLASK_DEV turns on the debugger and reloader.
+    app.run(debug=bool(os.getenv('FLASK_DEV')), host='0.0.0.0', port=5000)